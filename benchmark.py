@@ -0,0 +1,368 @@
+from functools import partial
+from string import ascii_lowercase
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import byte_sizes
+import grid_ciphers
+import hill_cipher
+import string_matrix
+import string_processing
+import transposition_ciphers
+
+'''
+	benchmarks
+
+	time, throughput, peak memory and scaling exponent of every
+	cipher and of the string helpers, over inputs from 100 B to 100 MB,
+	without network access
+
+	usage:
+		python benchmark.py [--max-size 10MB] [--only grid.bifid]
+			[--output run.json] [--compare baseline.json]
+
+	functions:
+		sample_text() : deterministic plaintext of a given size
+		benchmarks() : setup function of every benchmark by name
+		measure() : time and peak memory of one call
+		scaling_exponent() : growth of the time with the input size
+		run() : run benchmarks over input sizes
+		compare() : regressions of a run against a baseline
+'''
+
+SIZES = (
+	100, 1000, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8
+)
+DEFAULT_MAX_SIZE = 10 ** 6
+# shorter inputs are dominated by call overhead
+# and left out of the scaling exponent
+MIN_SCALING_SIZE = 10 ** 4
+# relative slowdown reported as a regression
+REGRESSION_TOLERANCE = 0.2
+# larger sizes of a benchmark are skipped past this many seconds
+TIME_LIMIT = 60.0
+# plaintext characters, spaces about one in six
+SAMPLE_CHARS = ascii_lowercase + '      '
+TRANSPOSITION_KEY = 'zebras'
+SCYTALE_TURNS = 4
+HILL_KEY = [[3, 10, 20, 20], [20, 9, 17, 9], [4, 17, 0, 2], [9, 17, 7, 12]]
+
+def sample_text(size, seed = 0):
+	"""
+		arguments
+			size : int
+			seed : int
+		return
+			string
+				lowercase letters and spaces
+	"""
+	table = bytes(
+		ord(SAMPLE_CHARS[i % len(SAMPLE_CHARS)]) for i in range(256)
+	)
+	b = random.Random(seed).randbytes(size)
+	return b.translate(table).decode('ascii')
+
+def cipher_benchmarks(name, encode, decode):
+	"""
+		arguments
+			name : string
+			encode, decode : function
+				string to string
+		return
+			dict {name : setup function}
+	"""
+	return {
+		name + '.encode': lambda s: partial(encode, s),
+		name + '.decode': lambda s: partial(decode, encode(s))
+	}
+
+def benchmarks():
+	"""
+		every benchmark, set up from a plaintext outside of the timing
+
+		return
+			dict {name : function}
+				taking the sample text and returning
+				the function to time
+	"""
+	res = {}
+	grids = {
+		'polybius': grid_ciphers.PolybiusGrid('keyword'),
+		'bifid': grid_ciphers.BifidGrid('keyword'),
+		'playfair': grid_ciphers.PlayfairGrid('playfair example'),
+		# keyword codes below 45 keep every sum at two digits
+		'nihilist': grid_ciphers.NihilistGrid('dragon', 'zebras'),
+		'adfgx': grid_ciphers.ADFGXGrid('cargo', 'btalpdhozkqfvsngicuxmrewy'),
+		'adfgvx': grid_ciphers.ADFGVXGrid(
+			'privacy', 'na1c3h8tb2ome5wrpd4f6g7i9j0klqsuvxyz'
+		)
+	}
+	for name, grid in grids.items():
+		res.update(cipher_benchmarks('grid.' + name, grid.encode, grid.decode))
+	l = len(TRANSPOSITION_KEY)
+	res.update(cipher_benchmarks(
+		'transposition.scytale',
+		lambda s: transposition_ciphers.ScytaleCipher(
+			'encode', s, SCYTALE_TURNS
+		).get_s(),
+		lambda s: transposition_ciphers.ScytaleCipher(
+			'decode', s, SCYTALE_TURNS
+		).get_s()
+	))
+	res.update(cipher_benchmarks(
+		'transposition.columnar',
+		lambda s: transposition_ciphers.TranspositionCipher(
+			'encode', s, (-1, l), TRANSPOSITION_KEY
+		).get_s(),
+		lambda s: transposition_ciphers.TranspositionCipher(
+			'decode', s, (-1, len(s) // l), TRANSPOSITION_KEY
+		).get_s()
+	))
+	res.update(cipher_benchmarks(
+		'hill',
+		lambda s: hill_cipher.hill_cipher_encode(s, HILL_KEY)[0],
+		lambda s: hill_cipher.hill_cipher_decode(s, HILL_KEY)[0]
+	))
+	helpers = {
+		'alpha': string_processing.alpha,
+		'digits': string_processing.digits,
+		'alnum': string_processing.alnum,
+		'unique': string_processing.unique,
+		'remove': lambda s: string_processing.remove(s, 'aeiou'),
+		'replace': lambda s: string_processing.replace(s, {'c': 'k'}),
+		'group_alpha': lambda s: string_processing.group_alpha(s, 2),
+		'group_n': lambda s: string_processing.group_n(s, 5),
+		'split_n': lambda s: string_processing.split_n(s, 5),
+		'every_nth': lambda s: string_processing.every_nth(s, 3)
+	}
+	for name, f in helpers.items():
+		res['string_processing.' + name] = partial(partial, f)
+	res['string_matrix.string_matrix'] = partial(
+		partial, string_matrix.string_matrix, dimensions = (-1, l)
+	)
+	for name, cls in (
+			('transpose', string_matrix.StringMatrix),
+			('array_transpose', string_matrix.ArrayStringMatrix)):
+		res['string_matrix.' + name] = lambda s, cls = cls: partial(
+			transposed_string, cls(s, (-1, l), padding = 'x')
+		)
+	return res
+
+def transposed_string(m):
+	m.transpose()
+	return m.s
+
+def measure(f, repeat = 3, memory = True):
+	"""
+		arguments
+			f : function
+				no arguments
+			repeat : int
+				timed calls, the fastest is kept
+			memory : bool
+				if True, one more call is traced for its peak memory
+		return
+			dict
+				seconds, and peak_memory in bytes if traced
+	"""
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		f()
+		times.append(time.perf_counter() - start)
+	res = {'seconds': min(times)}
+	if memory:
+		tracemalloc.start()
+		try:
+			f()
+			res['peak_memory'] = tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+	return res
+
+def scaling_exponent(points):
+	"""
+		least squares slope of log(seconds) over log(size),
+		about 1 for linear time
+
+		arguments
+			points : dict {size : seconds}
+		return
+			float
+			None
+				if fewer than two sizes were timed
+	"""
+	res = None
+	large = {n: t for n, t in points.items() if n >= MIN_SCALING_SIZE}
+	if len(large) >= 2:
+		points = large
+	points = {n: t for n, t in points.items() if t > 0}
+	if len(points) >= 2:
+		x = np.log([float(n) for n in points])
+		y = np.log(list(points.values()))
+		res = float(np.polyfit(x, y, 1)[0])
+	return res
+
+def run(names, sizes, repeat = 3, memory = True,
+		time_limit = TIME_LIMIT, log = None):
+	"""
+		arguments
+			names : list of strings
+				benchmarks to run
+			sizes : list of int
+				input sizes in bytes
+			repeat : int
+			memory : bool
+			time_limit : float
+				seconds past which larger sizes are skipped
+			log : file
+				progress is written there if not None
+		return
+			dict
+				environment and results by benchmark and size
+	"""
+	setups = benchmarks()
+	text = sample_text(max(sizes))
+	res = {
+		'environment': {
+			'python': platform.python_version(),
+			'numpy': np.__version__,
+			'machine': platform.machine(),
+			'system': platform.system(),
+			'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+		},
+		'repeat': repeat,
+		'benchmarks': {}
+	}
+	for name in names:
+		results = {}
+		points = {}
+		for size in sorted(sizes):
+			if points and max(points.values()) > time_limit:
+				results[str(size)] = {'skipped': 'time limit'}
+				continue
+			try:
+				r = measure(setups[name](text[:size]), repeat, memory)
+			except Exception as e:
+				r = {'error': '{}: {}'.format(type(e).__name__, e)}
+			else:
+				r['throughput'] = size / r['seconds'] if r['seconds'] else None
+				points[size] = r['seconds']
+			results[str(size)] = r
+			if log is not None:
+				print(format_result(name, size, r), file = log, flush = True)
+		res['benchmarks'][name] = {
+			'sizes': results,
+			'scaling_exponent': scaling_exponent(points)
+		}
+	return res
+
+def compare(results, baseline, tolerance = REGRESSION_TOLERANCE):
+	"""
+		arguments
+			results, baseline : dict
+				as returned by run()
+			tolerance : float
+				relative slowdown allowed
+		return
+			list of tuples
+				(benchmark, size, baseline seconds, seconds)
+				for every timing slower than the baseline
+				by more than the tolerance
+	"""
+	res = []
+	old = baseline.get('benchmarks', {})
+	for name, b in results['benchmarks'].items():
+		for size, r in b['sizes'].items():
+			o = old.get(name, {}).get('sizes', {}).get(size, {})
+			if 'seconds' in r and o.get('seconds'):
+				if r['seconds'] > o['seconds'] * (1 + tolerance):
+					res.append((name, int(size), o['seconds'], r['seconds']))
+	return res
+
+def format_result(name, size, r):
+	res = '{:40} {:>10}'.format(name, byte_sizes.format_size(size))
+	if 'seconds' in r:
+		res += ' {:12.6f} s {:10.2f} MB/s'.format(
+			r['seconds'], (r['throughput'] or 0) / 1e6
+		)
+		if 'peak_memory' in r:
+			res += ' {:10.2f} MB peak'.format(r['peak_memory'] / 1e6)
+	else:
+		res += ' ' + r.get('error', r.get('skipped', ''))
+	return res
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(
+		description = 'benchmark the ciphers and string helpers'
+	)
+	parser.add_argument(
+		'--sizes', nargs = '+', type = byte_sizes.parse_size,
+		help = 'input sizes, e.g. 100 10KB 1MB (default: 100B up to --max-size)'
+	)
+	parser.add_argument(
+		'--max-size', type = byte_sizes.parse_size,
+		default = DEFAULT_MAX_SIZE,
+		help = 'largest default size, up to 100MB (default: 1MB)'
+	)
+	parser.add_argument(
+		'--only', nargs = '+', default = [],
+		help = 'run the benchmarks whose names contain any of these'
+	)
+	parser.add_argument('--list', action = 'store_true',
+		help = 'list the benchmarks and exit')
+	parser.add_argument('--repeat', type = int, default = 3)
+	parser.add_argument('--no-memory', action = 'store_true',
+		help = 'do not trace peak memory')
+	parser.add_argument('--time-limit', type = float, default = TIME_LIMIT,
+		help = 'seconds after which larger sizes are skipped')
+	parser.add_argument('--output', help = 'write the results as JSON')
+	parser.add_argument('--compare',
+		help = 'baseline JSON, exit with status 1 on regressions')
+	parser.add_argument('--tolerance', type = float,
+		default = REGRESSION_TOLERANCE,
+		help = 'relative slowdown reported as a regression')
+	args = parser.parse_args(argv)
+	names = [
+		n for n in benchmarks()
+		if not args.only or any(o in n for o in args.only)
+	]
+	res = 0
+	if args.list:
+		print('\n'.join(names))
+	else:
+		sizes = args.sizes or [n for n in SIZES if n <= args.max_size]
+		results = run(
+			names, sizes, args.repeat, not args.no_memory,
+			args.time_limit, log = sys.stderr
+		)
+		for name, b in results['benchmarks'].items():
+			if b['scaling_exponent'] is not None:
+				print('{:40} scaling exponent {:.2f}'.format(
+					name, b['scaling_exponent']
+				), file = sys.stderr)
+		if args.output:
+			with open(args.output, 'w') as f:
+				json.dump(results, f, indent = 1)
+		if args.compare:
+			with open(args.compare) as f:
+				baseline = json.load(f)
+			regressions = compare(results, baseline, args.tolerance)
+			for name, size, old, new in regressions:
+				print('regression {:40} {:>10} {:.6f} s -> {:.6f} s ({:+.0%})'.format(
+					name, byte_sizes.format_size(size),
+					old, new, new / old - 1
+				), file = sys.stderr)
+			if regressions:
+				res = 1
+	return res
+
+if __name__ == '__main__':
+	sys.exit(main())
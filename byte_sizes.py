@@ -0,0 +1,45 @@
+'''
+	byte sizes on the command line
+
+	usage:
+		parse_size('64KB') == 64000
+		format_size(10 ** 6) == '1MB'
+
+	functions:
+		parse_size() : number of bytes of a size like 100, 64KB or 1M
+		format_size() : shortest exact size in bytes, KB, MB or GB
+'''
+
+# decimal byte units of parse_size() and format_size()
+SIZE_UNITS = {'': 1, 'B': 1, 'K': 10 ** 3, 'M': 10 ** 6, 'G': 10 ** 9}
+
+def parse_size(s):
+	"""
+		arguments
+			s : string
+				bytes, with an optional K, M or G prefix,
+				as in 100, 64KB or 1M
+		return
+			int
+	"""
+	s = s.strip().upper()
+	if s.endswith('B'):
+		s = s[:-1]
+	unit = s[-1:] if s[-1:] in SIZE_UNITS else ''
+	return int(float(s[:len(s) - len(unit)]) * SIZE_UNITS[unit])
+
+def format_size(size):
+	"""
+		arguments
+			size : int
+				bytes
+		return
+			string
+				as in 100B, 64KB or 1MB
+	"""
+	res = '{}B'.format(size)
+	for unit in ('G', 'M', 'K'):
+		if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+			res = '{}{}B'.format(size // SIZE_UNITS[unit], unit)
+			break
+	return res
@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
+from functools import partial
 
+import instrumentation
+import parallel
 import string_matrix
 import string_processing
 
@@ -12,27 +15,51 @@ import string_processing
 		coordinates() : coordinates of a character in the grid 
 			with translation
 		encode() : encode a string using the grid
+		normalize() : apply the translation table to a plaintext
 		decode() : decode a string using the grid
+		encode_iter() : encode an iterable of chunks, 
+			yielding the encoded chunks as they are ready
+		decode_iter() : decode an iterable of chunks, 
+			yielding the decoded chunks as they are ready
+		encode_many() : encode many strings in a process pool
+		decode_many() : decode many strings in a process pool
+		set_grid() : replace the characters of the grid
+		mutate() : swap characters of the grid in place, 
+			keeping the lookup tables and the codec up to date
+		swap_letters(), swap_rows(), swap_columns(), reflect() : 
+			mutations of the grid
+		undo() : revert the last mutation
+		grid_string() : characters of the grid for an alphabet 
+			and a key
+		grid_codec() : vectorized codec for long strings, if the grid 
+			supports one
 '''
 
 class CipherGrid(string_matrix.StringMatrix, ABC):
 	alphabet = ''
 	grid_key = ''
 	translation_table = {}
+	translator = None
+	codec = None
+	# swaps of each mutation, for undo()
+	history = None
+	# shortest string encoded or decoded through grid_codec()
+	bulk_threshold = 256
+	# character class and length of the parts of a plaintext 
+	# and of a ciphertext, for cutting streams between parts
+	stream_parts = {'encode': ('alpha', 1), 'decode': ('alpha', 2)}
 
 	def __init__(self, alphabet, dimensions, 
 			grid_key = None, base_index = 0, **kwargs):
-		s = alphabet
 		self.grid_key = grid_key
-		if grid_key is not None:
-			s = grid_key + s
 		replacements = kwargs.pop('replacements', {})
 		self.translation_table = {
 			k: v for k, v in replacements.items() if v
 		}
-		remove = list(replacements.keys())
-		s = string_processing.remove(s, remove)
-		s = string_processing.unique(s)
+		self.translator = string_processing.Translator(
+			self.translation_table
+		)
+		s = self.grid_string(alphabet, grid_key, replacements)
 		super().__init__(s, dimensions, base_index = base_index)
 		if self.s is not None:
 			self.alphabet = self.s
@@ -45,47 +72,239 @@ class CipherGrid(string_matrix.StringMatrix, ABC):
 		res = None
 		if c in self.translation_table:
 			c = self.translation_table[c]
-		coords_list = super().coordinates(c)
+		if self.char_index is None:
+			self.index_matrix()
+		coords_list = self.char_index.get(c)
 		if coords_list:
 			res = coords_list[0]
 		return res
 
 	def encode(self, s, **kwargs):
-		kwargs.update(
-			{
-				'mode': 'encode',
-				'to_parts': self.plaintext_to_parts,
-				'transform_part': self.encode_part,
-				'parts_to_string': self.encoded_parts_to_string
-			}
-		)
-		return self.__transform(s, **kwargs)
+		res = None
+		codec = self.bulk_codec(s, **kwargs)
+		if codec is not None:
+			with instrumentation.stage(self, 'codec_encode', s) as stage:
+				res = codec.encode(s)
+				stage.output(res)
+		if res is None:
+			kwargs.update(
+				{
+					'mode': 'encode',
+					'to_parts': self.plaintext_to_parts,
+					'transform_part': self.encode_part,
+					'parts_to_string': self.encoded_parts_to_string
+				}
+			)
+			res = self.__transform(self.normalize(s), **kwargs)
+		return res
 
 	def decode(self, s, **kwargs):
-		kwargs.update(
-			{
-				'mode': 'decode',
-				'to_parts': self.ciphertext_to_parts,
-				'transform_part': self.decode_part,
-				'parts_to_string': self.decoded_parts_to_string				
-			}
-		)
-		return self.__transform(s, **kwargs)
+		res = None
+		codec = self.bulk_codec(s, **kwargs)
+		if codec is not None:
+			with instrumentation.stage(self, 'codec_decode', s) as stage:
+				res = codec.decode(s)
+				stage.output(res)
+		if res is None:
+			kwargs.update(
+				{
+					'mode': 'decode',
+					'to_parts': self.ciphertext_to_parts,
+					'transform_part': self.decode_part,
+					'parts_to_string': self.decoded_parts_to_string				
+				}
+			)
+			res = self.__transform(s, **kwargs)
+		return res
+
+	def encode_iter(self, chunks):
+		return self.__transform_iter('encode', chunks)
+
+	def decode_iter(self, chunks):
+		return self.__transform_iter('decode', chunks)
+
+	def __transform_iter(self, mode, chunks):
+		# every chunk is transformed up to its last whole part, 
+		# the rest is carried over to the next chunk, ciphers mixing 
+		# the whole message transform it at the end of the stream
+		transform = getattr(self, mode)
+		if self.whole_message(mode):
+			res = transform(''.join(chunks))
+			if res:
+				yield res
+		else:
+			rest = ''
+			for chunk in chunks:
+				ready, rest = self.split_stream(rest + chunk, mode)
+				res = transform(ready) if ready else None
+				if res:
+					yield res
+			res = transform(rest) if rest else None
+			if res:
+				yield res
+
+	def whole_message(self, mode):
+		return False
+
+	def split_stream(self, s, mode):
+		# s cut after its last whole group of stream_period() parts
+		chars, n = self.stream_parts[mode]
+		i = string_processing.groups_end(s, n, chars, self.stream_period())
+		return (s[:i], s[i:])
+
+	def stream_period(self):
+		return 1
+
+	def encode_many(self, messages, workers = None, chunk_size = None):
+		return self.__transform_many('encode', messages, workers, chunk_size)
+
+	def decode_many(self, messages, workers = None, chunk_size = None):
+		return self.__transform_many('decode', messages, workers, chunk_size)
+
+	def __transform_many(self, mode, messages, workers, chunk_size):
+		# the grid is pickled once per worker, messages are sent 
+		# in chunks and results stream back in order
+		if parallel.worker_count(workers) == 1:
+			res = map(getattr(self, mode), messages)
+		else:
+			res = parallel.imap_ordered(
+				partial(transform_messages, mode), messages, 
+				initializer = init_worker, initargs = (self,),
+				workers = workers, chunk_size = chunk_size
+			)
+		return res
 
 	def __transform(self, s, **kwargs):
 		res = []
 		to_parts = kwargs.pop('to_parts')
 		transform_part = kwargs.pop('transform_part')
 		parts_to_string = kwargs.pop('parts_to_string')
-		parts = to_parts(s)
-		i = 0
-		for p in parts:
-			kwargs.update({'index': i})
-			p = transform_part(p, **kwargs)
-			res.append(p)
-			i += 1
-		kwargs.pop('index')
-		return parts_to_string(res)
+		with instrumentation.stage(self, 'to_parts', s) as stage:
+			parts = to_parts(s)
+			stage.output(parts)
+		with instrumentation.stage(self, 'transform_part', parts) as stage:
+			i = 0
+			for p in parts:
+				kwargs.update({'index': i})
+				p = transform_part(p, **kwargs)
+				res.append(p)
+				i += 1
+			kwargs.pop('index', None)
+			stage.output(res)
+		with instrumentation.stage(self, 'parts_to_string', res) as stage:
+			res = parts_to_string(res)
+			stage.output(res, len(parts))
+		return res
+
+	def set_grid(self, s):
+		# new grid characters in the same dimensions
+		res = False
+		m = string_matrix.string_matrix(s, self.dimensions)
+		if m:
+			self.matrix = m
+			self.s = string_matrix.matrix_to_string(m)
+			self.alphabet = self.s
+			self.reset_index()
+			self.clear_history()
+			res = True
+		return res
+
+	def mutate(self, swaps, record = True):
+		# swap characters at pairs of coordinates in place
+		res = []
+		for p1, p2 in swaps:
+			if self.swap(p1, p2):
+				res.append((p1, p2))
+		if res:
+			self.alphabet = self.s
+			self.cells_swapped(res)
+			if record:
+				if self.history is None:
+					self.history = []
+				self.history.append(res)
+		return res
+
+	def swap_letters(self, a, b):
+		res = []
+		# single letters, also where a subclass locates pairs
+		p1 = CipherGrid.coordinates(self, a)
+		p2 = CipherGrid.coordinates(self, b)
+		if p1 and p2:
+			res = self.mutate([(p1, p2)])
+		return res
+
+	def swap_rows(self, r1, r2):
+		b = self.base_index
+		columns = range(b, b + len(self.matrix[0]))
+		return self.mutate([((r1, c), (r2, c)) for c in columns])
+
+	def swap_columns(self, c1, c2):
+		b = self.base_index
+		rows = range(b, b + len(self.matrix))
+		return self.mutate([((r, c1), (r, c2)) for r in rows])
+
+	def reflect(self, axis):
+		# axis 'rows' reverses the order of the rows,
+		# 'columns' the order of the columns, and 'diagonal' 
+		# transposes a square grid
+		swaps = []
+		b = self.base_index
+		rows, columns = len(self.matrix), len(self.matrix[0])
+		if axis == 'rows':
+			swaps = [
+				((b + r, b + c), (b + rows - 1 - r, b + c))
+				for r in range(rows // 2) for c in range(columns)
+			]
+		elif axis == 'columns':
+			swaps = [
+				((b + r, b + c), (b + r, b + columns - 1 - c))
+				for r in range(rows) for c in range(columns // 2)
+			]
+		elif axis == 'diagonal' and rows == columns:
+			swaps = [
+				((b + r, b + c), (b + c, b + r))
+				for r in range(rows) for c in range(r + 1, columns)
+			]
+		return self.mutate(swaps)
+
+	def undo(self):
+		# revert the last recorded mutation
+		res = []
+		if self.history:
+			res = self.mutate(reversed(self.history.pop()), record = False)
+		return res
+
+	def clear_history(self):
+		self.history = None
+
+	def cells_swapped(self, swaps):
+		# keep the codec in step with the grid
+		if self.codec is not None:
+			b = self.base_index
+			columns = len(self.matrix[0])
+			for p1, p2 in swaps:
+				self.codec.swap_cells(
+					(p1[0] - b) * columns + p1[1] - b, 
+					(p2[0] - b) * columns + p2[1] - b
+				)
+
+	def bulk_codec(self, s, **kwargs):
+		res = None
+		if not kwargs and len(s) >= self.bulk_threshold:
+			if self.codec is None:
+				self.codec = self.grid_codec()
+			res = self.codec
+		return res
+
+	def grid_codec(self):
+		return None
+
+	def normalize(self, s):
+		return self.translator(s)
+
+	def reset_index(self):
+		super().reset_index()
+		self.codec = None
 
 	@abstractmethod
 	def plaintext_to_parts(self, s):
@@ -123,6 +342,14 @@ class CipherGrid(string_matrix.StringMatrix, ABC):
 	def decoded_parts_to_string(self, parts):
 		return ''.join(parts)	
 
+	@staticmethod
+	def grid_string(alphabet, grid_key = None, replacements = None):
+		s = alphabet
+		if grid_key is not None:
+			s = grid_key + s
+		s = string_processing.remove(s, list((replacements or {}).keys()))
+		return string_processing.unique(s)
+
 	@staticmethod
 	def replacements_dict(remove, translate):
 		replacements = None
@@ -130,4 +357,19 @@ class CipherGrid(string_matrix.StringMatrix, ABC):
 			replacements = {remove : ''}
 		elif translate:
 			replacements = dict(zip(*translate)) 	
-		return replacements	
\ No newline at end of file
+		return replacements	
+
+'''
+	process pool workers
+'''
+
+# grid of the current worker process
+worker_grid = None
+
+def init_worker(grid):
+	global worker_grid
+	worker_grid = grid
+
+def transform_messages(mode, messages):
+	f = getattr(worker_grid, mode)
+	return [f(m) for m in messages]
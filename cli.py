@@ -0,0 +1,397 @@
+import argparse
+import math
+import mmap
+import os
+import re
+import stat
+import sys
+import time
+
+import byte_sizes
+import grid_ciphers
+import hill_cipher
+import parallel
+import string_processing
+import transposition_ciphers
+
+'''
+	command line
+
+	encode or decode standard input, a file or many files with any
+	of the ciphers, streaming the text through encode_iter() and
+	decode_iter() in chunks, input files read through memory maps,
+	many files spread over a process pool, and the throughput
+	reported on standard error
+
+	usage:
+		python -m cli encode playfair --key monarchy < in.txt > out.txt
+		python -m cli decode hill --key '3 10 20 20 ...' in.txt -o out.txt
+		python -m cli encode adfgvx --key privacy \
+			--transposition-key cargo *.txt --output-dir encoded/
+
+	functions:
+		build_cipher() : cipher selected by the command line arguments
+		parse_hill_key() : square key matrix from a list of numbers
+		input_chunks() : text chunks of a file or of standard input
+		transform_file() : encode or decode one input to one output
+		transform_files() : encode or decode many files,
+			in a process pool if there are many workers
+		format_report() : throughput of a run
+'''
+
+CIPHER_NAMES = (
+	'polybius', 'bifid', 'playfair', 'nihilist', 'adfgx', 'adfgvx',
+	'hill', 'columnar', 'scytale'
+)
+# characters or bytes read at a time
+DEFAULT_CHUNK_SIZE = 10 ** 6
+STDIO = '-'
+
+class TranspositionStream():
+	"""
+		encode_iter() and decode_iter() of a transposition cipher
+		with its arguments
+
+		properties
+			cipher_class : class
+				TranspositionCipher or ScytaleCipher
+			transposition_key : string
+				None for ScytaleCipher
+			turns : int
+	"""
+	cipher_class = None
+	transposition_key = None
+	turns = None
+
+	def __init__(self, cipher_class, transposition_key = None, turns = None):
+		self.cipher_class = cipher_class
+		if transposition_key:
+			self.transposition_key = string_processing.unique(
+				transposition_key
+			)
+		self.turns = turns
+
+	def encode_iter(self, chunks):
+		return self.cipher_class.encode_iter(chunks, *self.arguments())
+
+	def decode_iter(self, chunks):
+		s = ''.join(chunks)
+		return self.cipher_class.decode_iter([s], *self.arguments(len(s)))
+
+	def arguments(self, length = None):
+		# the columns of a message decoded, as ADFGVXGrid reads them
+		res = (self.turns,)
+		if self.transposition_key:
+			l = len(self.transposition_key)
+			dimensions = (-1, l)
+			if length is not None:
+				dimensions = (-1, length // l)
+			res = (dimensions, self.transposition_key)
+		return res
+
+def build_cipher(args):
+	"""
+		arguments
+			args : argparse.Namespace
+		return
+			object with encode_iter() and decode_iter()
+		raises
+			ValueError
+				if a key the cipher needs is missing or invalid
+	"""
+	name = args.cipher
+	if name == 'nihilist' and not args.keyword:
+		raise ValueError('{} needs --keyword'.format(name))
+	if name in ('adfgx', 'adfgvx', 'columnar') and not args.transposition_key:
+		raise ValueError('{} needs --transposition-key'.format(name))
+	if name == 'scytale' and not args.turns:
+		raise ValueError('scytale needs --turns')
+	if name == 'polybius':
+		res = grid_ciphers.PolybiusGrid(args.key)
+	elif name == 'bifid':
+		res = grid_ciphers.BifidGrid(args.key, period = args.period)
+	elif name == 'playfair':
+		res = grid_ciphers.PlayfairGrid(args.key)
+	elif name == 'nihilist':
+		res = grid_ciphers.NihilistGrid(args.keyword, args.key)
+		if not res.valid_keyword():
+			raise ValueError('the keyword has letters outside the grid')
+	elif name == 'adfgx':
+		res = grid_ciphers.ADFGXGrid(args.transposition_key, args.key)
+	elif name == 'adfgvx':
+		res = grid_ciphers.ADFGVXGrid(args.transposition_key, args.key)
+	elif name == 'hill':
+		key = None
+		block_size = args.block_size
+		if args.key:
+			key = parse_hill_key(args.key)
+			block_size = len(key)
+		elif args.mode == 'decode':
+			raise ValueError('decoding hill needs --key')
+		res = hill_cipher.HillCipher(key, block_size)
+		if res.key is None:
+			raise ValueError('the Hill key is not invertible')
+	elif name == 'columnar':
+		res = TranspositionStream(
+			transposition_ciphers.TranspositionCipher,
+			transposition_key = args.transposition_key
+		)
+	else:
+		res = TranspositionStream(
+			transposition_ciphers.ScytaleCipher, turns = args.turns
+		)
+	return res
+
+def parse_hill_key(s):
+	"""
+		arguments
+			s : string
+				the numbers of the key row by row, separated
+				by spaces or commas
+		return
+			list of lists of int
+		raises
+			ValueError
+				if the numbers do not form a square matrix
+	"""
+	numbers = [int(n) for n in re.findall(r'-?\d+', s)]
+	n = math.isqrt(len(numbers))
+	if n == 0 or n * n != len(numbers):
+		raise ValueError('a Hill key needs a square number of numbers')
+	return [numbers[i:i + n] for i in range(0, len(numbers), n)]
+
+def input_chunks(f, chunk_size = DEFAULT_CHUNK_SIZE, sizes = None):
+	"""
+		arguments
+			f : binary file object
+			chunk_size : int
+				bytes read at a time
+			sizes : list
+				the size of every chunk of bytes read
+				is appended to it
+		return
+			generator of strings
+				text chunks, a regular file read through a memory
+				map and a pipe as soon as data arrives
+	"""
+	info = os.fstat(f.fileno())
+	if stat.S_ISREG(info.st_mode) and info.st_size > 0:
+		with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as m:
+			chunks = (
+				m[i : i + chunk_size] for i in range(0, len(m), chunk_size)
+			)
+			yield from string_processing.text_chunks(counted(chunks, sizes))
+	else:
+		chunks = iter(lambda: f.read1(chunk_size), b'')
+		yield from string_processing.text_chunks(counted(chunks, sizes))
+
+def counted(chunks, sizes):
+	for chunk in chunks:
+		if sizes is not None:
+			sizes.append(len(chunk))
+		yield chunk
+
+def transform_file(cipher, mode, source, target,
+		chunk_size = DEFAULT_CHUNK_SIZE):
+	"""
+		arguments
+			cipher : object with encode_iter() and decode_iter()
+			mode : string
+				'encode' or 'decode'
+			source : string
+				path or STDIO
+			target : string
+				path or STDIO
+			chunk_size : int
+		return
+			tuple
+				(source, bytes read, bytes written, seconds, error),
+				error None on success
+	"""
+	start = time.perf_counter()
+	sizes = []
+	size_out = 0
+	error = None
+	try:
+		file_transform = getattr(cipher, mode + '_file', None)
+		if file_transform and STDIO not in (source, target):
+			# ADFGVX transposes files on disk rather than in memory
+			sizes.append(os.path.getsize(source))
+			size_out = file_transform(source, target, chunk_size)
+			if size_out is None:
+				error = 'cannot {} {}'.format(mode, source)
+		elif source == STDIO:
+			chunks = input_chunks(sys.stdin.buffer, chunk_size, sizes)
+			size_out = write_chunks(
+				getattr(cipher, mode + '_iter')(chunks), target
+			)
+		else:
+			with open(source, 'rb') as f:
+				chunks = input_chunks(f, chunk_size, sizes)
+				size_out = write_chunks(
+					getattr(cipher, mode + '_iter')(chunks), target
+				)
+	except (OSError, ValueError, TypeError) as e:
+		error = str(e)
+	seconds = time.perf_counter() - start
+	return (source, sum(sizes), size_out or 0, seconds, error)
+
+def write_chunks(chunks, target):
+	# UTF-8 chunks written to a file, or flushed one by one
+	# to standard output
+	res = 0
+	out = sys.stdout.buffer
+	if target != STDIO:
+		out = open(target, 'wb')
+	try:
+		for chunk in chunks or []:
+			b = chunk.encode('utf-8')
+			out.write(b)
+			if target == STDIO:
+				out.flush()
+			res += len(b)
+	finally:
+		if target != STDIO:
+			out.close()
+	return res
+
+def transform_files(cipher, mode, jobs, workers = None,
+		chunk_size = DEFAULT_CHUNK_SIZE):
+	"""
+		arguments
+			cipher : object with encode_iter() and decode_iter()
+			mode : string
+			jobs : list of tuples
+				(source, target)
+			workers : int
+				None for one process per CPU, 1 to run
+				in this process
+			chunk_size : int
+		return
+			generator of tuples
+				results of transform_file(), in the order of the jobs
+	"""
+	workers = min(parallel.worker_count(workers), len(jobs))
+	if workers <= 1 or any(STDIO in job for job in jobs):
+		res = (
+			transform_file(cipher, mode, source, target, chunk_size)
+			for source, target in jobs
+		)
+	else:
+		# one file per task, so a large file does not hold back
+		# the files sent along with it
+		res = parallel.imap_ordered(
+			transform_jobs, jobs,
+			initializer = init_worker,
+			initargs = (cipher, mode, chunk_size),
+			workers = workers, chunk_size = 1
+		)
+	return res
+
+def format_report(results, seconds):
+	"""
+		arguments
+			results : list of tuples
+				results of transform_file()
+			seconds : float
+				wall time of the run
+		return
+			string
+	"""
+	files = len(results)
+	size_in = sum(r[1] for r in results)
+	size_out = sum(r[2] for r in results)
+	failed = sum(1 for r in results if r[4] is not None)
+	rate = size_in / seconds / 1e6 if seconds > 0 else 0.0
+	return '{} file{}, {} failed, {} B in, {} B out, {:.3f} s, {:.2f} MB/s'.format(
+		files, '' if files == 1 else 's', failed, size_in, size_out,
+		seconds, rate
+	)
+
+def job_target(source, args):
+	# output path of an input file
+	res = args.output or STDIO
+	if args.output_dir or len(args.inputs) > 1:
+		directory = args.output_dir or os.path.dirname(source)
+		suffix = args.suffix or '.{}d'.format(args.mode)
+		res = os.path.join(directory, os.path.basename(source) + suffix)
+	return res
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(
+		prog = 'python -m cli',
+		description = 'encode or decode text with one of the ciphers'
+	)
+	parser.add_argument('mode', choices = ('encode', 'decode'))
+	parser.add_argument('cipher', choices = CIPHER_NAMES)
+	parser.add_argument(
+		'inputs', nargs = '*', default = [STDIO],
+		help = 'input files, - for standard input (default)'
+	)
+	parser.add_argument('--key',
+		help = 'grid key, or the numbers of a Hill key row by row')
+	parser.add_argument('--keyword', help = 'Nihilist keyword')
+	parser.add_argument('--transposition-key',
+		help = 'ADFGX, ADFGVX and columnar transposition key')
+	parser.add_argument('--period', type = int,
+		help = 'Bifid period (default: the whole message)')
+	parser.add_argument('--turns', type = int, help = 'Scytale turns')
+	parser.add_argument('--block-size', type = int, default = 4,
+		help = 'block size of a random Hill key')
+	parser.add_argument('-o', '--output',
+		help = 'output file of a single input (default: standard output)')
+	parser.add_argument('--output-dir',
+		help = 'directory of the outputs of many inputs '
+			'(default: next to each input)')
+	parser.add_argument('--suffix',
+		help = 'appended to the names of the outputs '
+			'(default: .encoded or .decoded)')
+	parser.add_argument('--workers', type = int,
+		help = 'processes for many files (default: one per CPU)')
+	parser.add_argument('--chunk-size', type = byte_sizes.parse_size,
+		default = DEFAULT_CHUNK_SIZE,
+		help = 'bytes read at a time, e.g. 64KB (default: 1MB)')
+	parser.add_argument('--quiet', action = 'store_true',
+		help = 'do not report the throughput')
+	args = parser.parse_intermixed_args(argv)
+	if args.output and len(args.inputs) > 1:
+		parser.error('--output takes a single input, use --output-dir')
+	try:
+		cipher = build_cipher(args)
+	except ValueError as e:
+		parser.error(str(e))
+	if args.cipher == 'hill' and not args.key and not args.quiet:
+		print('key: {}'.format(cipher.key), file = sys.stderr)
+	jobs = [(source, job_target(source, args)) for source in args.inputs]
+	start = time.perf_counter()
+	results = []
+	for r in transform_files(
+			cipher, args.mode, jobs, args.workers, args.chunk_size):
+		if r[4] is not None:
+			print('{}: {}'.format(r[0], r[4]), file = sys.stderr)
+		results.append(r)
+	seconds = time.perf_counter() - start
+	if not args.quiet:
+		print(format_report(results, seconds), file = sys.stderr)
+	return 1 if any(r[4] is not None for r in results) else 0
+
+'''
+	workers
+'''
+
+# (cipher, mode, chunk_size) of the current process
+worker_state = None
+
+def init_worker(cipher, mode, chunk_size):
+	global worker_state
+	worker_state = (cipher, mode, chunk_size)
+
+def transform_jobs(jobs):
+	cipher, mode, chunk_size = worker_state
+	return [
+		transform_file(cipher, mode, source, target, chunk_size)
+		for source, target in jobs
+	]
+
+if __name__ == '__main__':
+	sys.exit(main())
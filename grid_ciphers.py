@@ -1,6 +1,14 @@
-from string import ascii_lowercase, digits
+from string import ascii_letters, ascii_lowercase, digits
+import mmap
+import os
+import re
+import tempfile
+
+import numpy as np
 
 import cipher_grid
+import grid_codec
+import instrumentation
 import transposition_ciphers
 import string_processing
 
@@ -16,19 +24,45 @@ import string_processing
 		- ADFGVX
 '''
 
+# Playfair digraphs: two letters unless the second repeats the first
+PLAYFAIR_PAIRS = re.compile(r'(.)(?!\1).|.', re.S)
+# all the digraphs of a string, group 2 ending at the end 
+# of the string if its last letter is left single
+PLAYFAIR_PAIRING = re.compile(r'(?:(.)(?!\1).|(.))*', re.S)
+
 class PolybiusGrid(cipher_grid.CipherGrid):
+	stream_parts = {'encode': ('alpha', 1), 'decode': ('digits', 2)}
 
 	def __init__(self, grid_key = None, base_index = 1, **kwargs):
-		kwargs['replacements'] = cipher_grid.CipherGrid.replacements_dict(
-			kwargs.pop('remove', '').lower(), 
-			kwargs.pop('translate', '').lower()
-		) or {'c': 'k'}
-		if grid_key:
-			grid_key = string_processing.alpha(grid_key).lower()
+		kwargs['replacements'] = self.polybius_replacements(
+			kwargs.pop('remove', ''), kwargs.pop('translate', '')
+		)
 		super().__init__(
-			ascii_lowercase, (5, 5), grid_key, base_index, **kwargs
+			ascii_lowercase, (5, 5), self.normalize_key(grid_key), 
+			base_index, **kwargs
 		)
 
+	@classmethod
+	def key_grid(cls, grid_key = None, remove = '', translate = '', 
+			**kwargs):
+		# characters of the grid for a key, without building the grid
+		return cls.grid_string(
+			ascii_lowercase, cls.normalize_key(grid_key), 
+			cls.polybius_replacements(remove, translate)
+		)
+
+	@staticmethod
+	def normalize_key(grid_key):
+		if grid_key:
+			grid_key = string_processing.alpha(grid_key).lower()
+		return grid_key
+
+	@staticmethod
+	def polybius_replacements(remove, translate):
+		return cipher_grid.CipherGrid.replacements_dict(
+			remove.lower(), translate.lower()
+		) or {'c': 'k'}
+
 	def plaintext_to_parts(self, s):
 		return string_processing.group_alpha(s, 1)
 
@@ -41,34 +75,229 @@ class PolybiusGrid(cipher_grid.CipherGrid):
 	def part_to_coords(self, p, **kwargs):
 		return tuple(map(int, p))
 
+	def grid_codec(self):
+		res = None
+		b = self.base_index
+		n = max(self.dimensions)
+		if self.s and b + n <= 10:
+			labels = ''.join(map(str, range(b, b + n)))
+			res = grid_codec.GridCodec(self, labels, 'digits')
+		return res
+
 class BifidGrid(PolybiusGrid):
+	# letters fractionated together, None for the whole message
+	period = None
 
-	def __init__(self, grid_key = None, **kwargs):
+	def __init__(self, grid_key = None, period = None, **kwargs):
 		super().__init__(grid_key, **kwargs)
+		self.period = period
 
 	def encode(self, s, **kwargs):
-		s = super().encode(s)
-		s = self.bifid_unzip(s)
-		return super().decode(s)
+		res = None
+		codec = self.bifid_codec()
+		if codec is not None:
+			with instrumentation.stage(self, 'fractionate', s) as stage:
+				i = codec.plaintext_indices(s)
+				res = self.fractionate(codec, i, 'encode')
+				stage.output(res, len(i))
+		if res is None:
+			s = super().encode(s)
+			with instrumentation.stage(self, 'bifid_unzip', s) as stage:
+				s = ''.join(map(self.bifid_unzip, self.period_parts(s, 2)))
+				stage.output(s)
+			res = super().decode(s)
+		return res
 
 	def decode(self, s):
-		s = super().encode(s)
-		s = self.bifid_zip(s)
-		return super().decode(s)
+		res = None
+		codec = self.bifid_codec()
+		if codec is not None:
+			with instrumentation.stage(self, 'fractionate', s) as stage:
+				i = codec.plaintext_indices(s)
+				res = self.fractionate(codec, i, 'decode')
+				stage.output(res, len(i))
+		if res is None:
+			s = super().encode(s)
+			with instrumentation.stage(self, 'bifid_zip', s) as stage:
+				s = ''.join(map(self.bifid_zip, self.period_parts(s, 2)))
+				stage.output(s)
+			res = super().decode(s)
+		return res
+
+	def whole_message(self, mode):
+		# only whole periods are transformed independently
+		return not self.period or self.bifid_codec() is None
+
+	def split_stream(self, s, mode):
+		# grid letters of s cut after the last whole period
+		codec = self.bifid_codec()
+		i = codec.plaintext_indices(s)
+		letters = codec.cells[i].tobytes().decode('utf-32-le')
+		cut = len(letters) - len(letters) % self.period
+		return (letters[:cut], letters[cut:])
+
+	def split_periods(self, s, periods = 1):
+		# grid letters of s in strings of whole periods, 
+		# which encode and decode independently of each other
+		codec = self.bifid_codec()
+		i = codec.plaintext_indices(s)
+		size = (self.period or len(i) or 1) * periods
+		for start in range(0, len(i), size):
+			cells = codec.cells[i[start:start + size]]
+			yield cells.tobytes().decode('utf-32-le')
+
+	def bifid_codec(self):
+		if self.codec is None:
+			self.codec = self.grid_codec()
+		return self.codec
+
+	def fractionate(self, codec, i, mode):
+		res = None
+		rows, columns = codec.dimensions
+		r, c = bifid_mix(i // columns, i % columns, self.period, mode)
+		i = r * columns + c
+		valid = np.all(r < rows) and np.all(c < columns)
+		if valid and np.all(i < len(codec.cells)):
+			res = codec.cells[i].tobytes().decode('utf-32-le')
+		return res
+
+	def period_parts(self, s, n):
+		size = len(s) or 1
+		if self.period:
+			size = self.period * n
+		return [s[i:i + size] for i in range(0, len(s), size)]
 
 	def bifid_unzip(self, s):
 		return s[::2] + s[1::2]
 
 	def bifid_zip(self, s):
-		l = len(s)
-		z = list(zip(s[:l // 2 + 1], s[l // 2:]))
-		return ''.join([''.join(p) for p in z])
+		h = len(s) // 2
+		n = len(s) - h
+		res = [''] * (2 * n)
+		res[::2] = s[:n]
+		res[1::2] = s[h:]
+		return ''.join(res)
 
 class PlayfairGrid(PolybiusGrid):
 	padding = 'x'
+	stream_parts = {'encode': ('alpha', 1), 'decode': ('alpha', 2)}
+	# {digraph : encoded digraph}, single letters padded
+	encode_table = None
+	# {digraph : decoded digraph}
+	decode_table = None
 
 	def __init__(self, grid_key = None, **kwargs):
 		super().__init__(grid_key, base_index = 0, **kwargs)
+		self.digraph_tables()
+
+	def encode(self, s, **kwargs):
+		res = None
+		if self.digraph_table_ready(s, **kwargs):
+			table = self.digraph_tables()[0]
+			with instrumentation.stage(self, 'digraph_encode', s) as stage:
+				try:
+					parts = [table[p] for p in self.plaintext_pairs(s)]
+				except KeyError:
+					pass
+				else:
+					res = ''.join(parts)
+					stage.output(res, len(parts))
+		if res is None:
+			res = super().encode(s, **kwargs)
+		return res
+
+	def decode(self, s, **kwargs):
+		res = None
+		if self.digraph_table_ready(s, **kwargs):
+			table = self.digraph_tables()[1]
+			with instrumentation.stage(self, 'digraph_decode', s) as stage:
+				try:
+					parts = [table[p] for p in self.ciphertext_to_parts(s)]
+				except KeyError:
+					pass
+				else:
+					res = self.decoded_parts_to_string(parts)
+					stage.output(res, len(parts))
+		if res is None:
+			res = super().decode(s, **kwargs)
+		return res
+
+	def digraph_table_ready(self, s, **kwargs):
+		# tables are rebuilt after reset_index() for long strings only
+		res = False
+		if not kwargs:
+			built = self.encode_table is not None
+			res = built or len(s) >= self.bulk_threshold
+		return res
+
+	def digraph_tables(self):
+		# every digraph of the letters in the grid substituted at once
+		if self.encode_table is None:
+			b = self.base_index
+			letters = []
+			coords = []
+			for c in ascii_letters:
+				p = cipher_grid.CipherGrid.coordinates(self, c)
+				if p:
+					letters.append(c)
+					coords.append((p[0] - b, p[1] - b))
+			digraphs = [x + y for x in letters for y in letters]
+			coords = np.array(coords, dtype = np.intp).reshape(-1, 2)
+			n = len(letters)
+			r1 = np.repeat(coords[:, 0], n)
+			c1 = np.repeat(coords[:, 1], n)
+			r2 = np.tile(coords[:, 0], n)
+			c2 = np.tile(coords[:, 1], n)
+			cells = np.array(
+				[[ord(c) for c in row] for row in self.matrix], 
+				dtype = np.uint32
+			)
+			tables = []
+			for shift in (1, -1):
+				a1, b1, a2, b2 = playfair_substitute(
+					r1, c1, r2, c2, cells.shape, shift
+				)
+				pairs = np.stack((cells[a1, b1], cells[a2, b2]), axis = 1)
+				s = pairs.tobytes().decode('utf-32-le')
+				tables.append({
+					p: s[2 * i : 2 * i + 2] for i, p in enumerate(digraphs)
+				})
+			encode_table, decode_table = tables
+			for x in letters:
+				p = x + self.padding
+				if p in encode_table:
+					encode_table[x] = encode_table[p]
+				else:
+					encode_table[x] = self.encode_part(p)
+			self.encode_table = encode_table
+			self.decode_table = decode_table
+		return (self.encode_table, self.decode_table)
+
+	def reset_index(self):
+		super().reset_index()
+		self.encode_table = None
+		self.decode_table = None
+
+	def cells_swapped(self, swaps):
+		super().cells_swapped(swaps)
+		self.encode_table = None
+		self.decode_table = None
+
+	def split_stream(self, s, mode):
+		res = super().split_stream(s, mode)
+		if mode == 'encode':
+			# a last letter left single may pair with the next chunk
+			letters = string_processing.alpha(s)
+			if PLAYFAIR_PAIRING.fullmatch(letters).end(2) == len(letters):
+				i = len(s) - 1
+				while not s[i].isascii() or not s[i].isalpha():
+					i -= 1
+				res = (s[:i], s[i:])
+		return res
+
+	def normalize(self, s):
+		# letters are paired before they are translated
+		return s
 
 	def coordinates(self, p):
 		p1, p2 = p
@@ -78,20 +307,18 @@ class PlayfairGrid(PolybiusGrid):
 		c1, c2 = coords
 		return super().locate(c1) + super().locate(c2)
 
+	def plaintext_pairs(self, s):
+		return (
+			m.group() for m in 
+			PLAYFAIR_PAIRS.finditer(string_processing.alpha(s))
+		)
+
 	def plaintext_to_parts(self, s):
-		s = super().plaintext_to_parts(s)
-		res = []
-		l = len(s)
-		i = 0
-		while i < l:
-			if i == l - 1 or s[i] == s[i + 1]:
-				p = s[i] + self.padding
-				i += 1
-			else:
-				p = s[i] + s[i + 1]
-				i += 2
-			res.append(p)
-		return res
+		padding = self.padding
+		return [
+			p if len(p) == 2 else p + padding 
+			for p in self.plaintext_pairs(s)
+		]
 
 	def ciphertext_to_parts(self, s):
 		return string_processing.group_alpha(s, 2)
@@ -108,6 +335,9 @@ class PlayfairGrid(PolybiusGrid):
 		res = super().decoded_parts_to_string(parts)
 		return string_processing.remove(res, self.padding)
 
+	def grid_codec(self):
+		return None
+
 	def playfair_substitution(self, coords, shift):
 		rows, columns = self.dimensions
 		a, b = coords
@@ -126,10 +356,14 @@ class PlayfairGrid(PolybiusGrid):
 
 class NihilistGrid(PolybiusGrid):
 	keyword = None
+	# Polybius code of each keyword letter
+	key_stream = None
 
 	def __init__(self, keyword, grid_key = None, **kwargs):
 		self.keyword = keyword
 		super().__init__(grid_key, **kwargs)
+		if self.valid_keyword():
+			self.key_digits()
 
 	def coords_to_part(self, coords, **kwargs):
 		pi = int(super().coords_to_part(coords, **kwargs))
@@ -141,12 +375,41 @@ class NihilistGrid(PolybiusGrid):
 		pi -= self.key_digit(kwargs.get('index'))
 		return super().part_to_coords(str(pi), **kwargs)
 
+	def grid_codec(self):
+		res = None
+		if self.s and self.valid_keyword():
+			res = grid_codec.NihilistCodec(self, self.key_digits())
+		return res
+
+	def reset_index(self):
+		super().reset_index()
+		self.key_stream = None
+
+	def cells_swapped(self, swaps):
+		# the codes of the keyword letters may have changed
+		self.key_stream = None
+		self.codec = None
+
+	def stream_period(self):
+		# chunks start at the first letter of the keyword
+		return len(self.keyword or '') or 1
+
+	def valid_keyword(self):
+		return all(map(self.coordinates, self.keyword or ''))
+
+	def key_digits(self):
+		if self.key_stream is None:
+			self.key_stream = [
+				int('{}{}'.format(*self.coordinates(c))) 
+				for c in self.keyword or ''
+			]
+		return self.key_stream
+
 	def key_digit(self, index):
 		res = 0
 		if self.keyword:
-			i = index % len(self.keyword)
-			c = self.coordinates(self.keyword[i])
-			res = int('{}{}'.format(*c))
+			key_stream = self.key_digits()
+			res = key_stream[index % len(key_stream)]
 		return res
 
 class ADFGVXGrid(cipher_grid.CipherGrid):
@@ -165,19 +428,90 @@ class ADFGVXGrid(cipher_grid.CipherGrid):
 	def encode(self, s, **kwargs): 
 		l = len(self.transposition_key)
 		s = super().encode(s, **kwargs)
-		cipher = transposition_ciphers.TranspositionCipher(
-			'encode', s, (-1, l), self.transposition_key
-		)
-		return cipher.get_s()
+		with instrumentation.stage(self, 'transposition', s) as stage:
+			cipher = transposition_ciphers.TranspositionCipher(
+				'encode', s, (-1, l), self.transposition_key
+			)
+			res = cipher.get_s()
+			stage.output(res)
+		return res
 
 	def decode(self, s, **kwargs):
-		l = len(self.transposition_key)
-		cipher = transposition_ciphers.TranspositionCipher(
-			'decode', s, (-1, len(s) // l), self.transposition_key
-		)
-		s = cipher.get_s()
+		s = self.untranspose(s)
 		return super().decode(s).strip(self.decoded_padding())
 
+	def whole_message(self, mode):
+		# the columnar transposition reads the whole message
+		return True
+
+	def untranspose(self, s):
+		# the substituted string before the transposition
+		l = len(self.transposition_key)
+		with instrumentation.stage(self, 'transposition', s) as stage:
+			cipher = transposition_ciphers.TranspositionCipher(
+				'decode', s, (-1, len(s) // l), self.transposition_key
+			)
+			res = cipher.get_s()
+			stage.output(res)
+		return res
+
+	def encode_file(self, source, target, chunk_size = 1 << 20):
+		l = len(self.transposition_key)
+		tmp = self.temporary_file(target)
+		try:
+			with open(source, 'rb') as f, open(tmp, 'wb') as out:
+				for chunk in string_processing.text_chunks(f, chunk_size):
+					out.write(super().encode(chunk).encode('ascii'))
+			res = transposition_ciphers.transpose_file(
+				'encode', tmp, target, self.transposition_key
+			)
+		finally:
+			os.remove(tmp)
+		return res
+
+	def decode_file(self, source, target, chunk_size = 1 << 20):
+		res = None
+		transposed = self.temporary_file(target)
+		decoded = self.temporary_file(target)
+		try:
+			size = transposition_ciphers.transpose_file(
+				'decode', source, transposed, self.transposition_key
+			)
+			if size is not None:
+				chunk_size += chunk_size % 2
+				with open(transposed, 'rb') as f, open(decoded, 'wb') as out:
+					for chunk in iter(lambda: f.read(chunk_size), b''):
+						s = super().decode(chunk.decode('latin-1'))
+						out.write(s.encode('utf-8'))
+				res = self.strip_file(decoded, target, chunk_size)
+		finally:
+			os.remove(transposed)
+			os.remove(decoded)
+		return res
+
+	def strip_file(self, source, target, chunk_size):
+		padding = self.decoded_padding().encode('utf-8')
+		p = len(padding)
+		with open(source, 'rb') as f, open(target, 'wb') as out:
+			if os.fstat(f.fileno()).st_size > 0:
+				with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as m:
+					start = 0
+					end = len(m)
+					while start < end and m[start : start + p] == padding:
+						start += p
+					while end > start and m[end - p : end] == padding:
+						end -= p
+					for i in range(start, end, chunk_size):
+						out.write(m[i : min(i + chunk_size, end)])
+			res = out.tell()
+		return res
+
+	def temporary_file(self, target):
+		directory = os.path.dirname(os.path.abspath(target))
+		fd, path = tempfile.mkstemp(dir = directory)
+		os.close(fd)
+		return path
+
 	def plaintext_to_parts(self, s):
 		return string_processing.group_alpha(s, 1)
 
@@ -190,6 +524,12 @@ class ADFGVXGrid(cipher_grid.CipherGrid):
 	def part_to_coords(self, p, **kwargs):
 		return tuple(map(self.labels.index, p))
 
+	def grid_codec(self):
+		res = None
+		if self.s:
+			res = grid_codec.GridCodec(self, ''.join(self.labels), 'alpha')
+		return res
+
 	def decoded_padding(self):
 		padding = self.padding
 		return self.locate(self.part_to_coords(padding + padding))
@@ -204,4 +544,73 @@ class ADFGXGrid(ADFGVXGrid):
 			kwargs.pop('remove', '').lower(), 
 			kwargs.pop('translate', '').lower()
 		) or {'i': 'j'}
-		super().__init__(transposition_key, grid_key = grid_key, **kwargs)
\ No newline at end of file
+		super().__init__(transposition_key, grid_key = grid_key, **kwargs)
+
+'''
+	Playfair substitution
+'''
+
+def playfair_substitute(r1, c1, r2, c2, dimensions, shift):
+	"""
+		playfair_substitution() of many digraphs at once
+
+		arguments
+			r1, c1, r2, c2 : numpy arrays of int
+				zero based row and column of the letters
+				of each digraph
+			dimensions : tuple of int
+			shift : int
+				1 to encode, -1 to decode
+		return
+			tuple of numpy arrays
+				rows and columns of the substituted letters
+	"""
+	rows, columns = dimensions
+	same_row = r1 == r2
+	same_column = ~same_row & (c1 == c2)
+	res_r1 = np.where(same_column, (r1 + shift) % rows, r1)
+	res_r2 = np.where(same_column, (r2 + shift) % rows, r2)
+	res_c1 = np.where(same_row, (c1 + shift) % columns, c1)
+	res_c2 = np.where(same_row, (c2 + shift) % columns, c2)
+	rectangle = ~same_row & ~same_column
+	res_c1 = np.where(rectangle, c2, res_c1)
+	res_c2 = np.where(rectangle, c1, res_c2)
+	return (res_r1, res_c1, res_r2, res_c2)
+
+'''
+	Bifid fractionation
+'''
+
+def bifid_mix(r, c, period = None, mode = 'encode'):
+	"""
+		arguments
+			r, c : numpy arrays of int
+				row and column of each letter
+			period : int
+				None for the whole message
+			mode : string
+				'encode' reads the rows then the columns of each period 
+				in pairs, 'decode' reverses it
+		return
+			tuple of numpy arrays
+	"""
+	n = len(r)
+	p = min(period or n, n) or 1
+	full = n - n % p
+	res_r = np.empty_like(r)
+	res_c = np.empty_like(c)
+	for start, stop, size in ((0, full, p), (full, n, n - full)):
+		if stop > start:
+			rows = r[start:stop].reshape(-1, size)
+			columns = c[start:stop].reshape(-1, size)
+			if mode == 'encode':
+				mixed = np.concatenate((rows, columns), axis = 1)
+				mixed = mixed.reshape(-1, size, 2)
+				res_r[start:stop] = mixed[:, :, 0].ravel()
+				res_c[start:stop] = mixed[:, :, 1].ravel()
+			else:
+				mixed = np.stack((rows, columns), axis = 2)
+				mixed = mixed.reshape(-1, 2 * size)
+				res_r[start:stop] = mixed[:, :size].ravel()
+				res_c[start:stop] = mixed[:, size:].ravel()
+	return (res_r, res_c)
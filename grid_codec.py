@@ -0,0 +1,311 @@
+from string import ascii_letters, digits
+
+import numpy as np
+
+'''
+	GridCodec class
+
+	vectorized encoding and decoding for grids that substitute
+	every plaintext letter with a pair of coordinate labels
+	(Polybius, ADFGX, ADFGVX)
+
+	functions:
+		encode() : encode a string in one pass over its codepoints
+		decode() : decode a string in one pass over its codepoints
+		plaintext_indices() : grid indices of the letters in a string
+		ciphertext_indices() : grid indices of the label pairs
+			in a string
+		swap_cells() : follow a swap of two grid characters
+'''
+
+CIPHERTEXT_CHARS = {
+	'alpha': ascii_letters,
+	'digits': digits
+}
+
+class GridCodec():
+	"""
+		properties
+			labels : string
+				label of each row and column index
+			dimensions : tuple of int
+				dimensions of the grid
+			plaintext_lut : numpy array
+				grid index of each ASCII codepoint,
+				-1 if the character is not encoded
+			label_lut : numpy array
+				label index of each ASCII codepoint,
+				-1 if the character is not a label
+			label_codes : numpy array
+				codepoints of the labels
+			ciphertext_mask : numpy array
+				True for the ASCII codepoints grouped into ciphertext parts
+			cells : numpy array
+				codepoints of the grid characters
+	"""
+	labels = None
+	dimensions = None
+	plaintext_lut = None
+	label_lut = None
+	ciphertext_mask = None
+	label_codes = None
+	cells = None
+
+	def __init__(self, grid, labels, ciphertext_chars):
+		"""
+			arguments
+				grid : CipherGrid
+				labels : string
+					one character per row and column index
+				ciphertext_chars : string
+					'alpha' or 'digits', the characters grouped
+					into pairs by the grid's ciphertext_to_parts()
+		"""
+		rows, columns = grid.dimensions
+		b = grid.base_index
+		self.labels = labels
+		self.dimensions = (rows, columns)
+		self.plaintext_lut = np.full(128, -1, dtype = np.intp)
+		for c in ascii_letters:
+			coords = grid.coordinates(c)
+			if coords:
+				r, col = coords
+				self.plaintext_lut[ord(c)] = (r - b) * columns + col - b
+		self.label_codes = np.frombuffer(labels.encode('ascii'), np.uint8)
+		self.label_lut = np.full(128, -1, dtype = np.intp)
+		self.label_lut[self.label_codes] = np.arange(len(labels))
+		self.ciphertext_mask = np.zeros(128, dtype = bool)
+		chars = CIPHERTEXT_CHARS[ciphertext_chars].encode('ascii')
+		self.ciphertext_mask[np.frombuffer(chars, np.uint8)] = True
+		self.cells = np.array([ord(c) for c in grid.s], dtype = np.uint32)
+
+	def swap_cells(self, i, j):
+		"""
+			follow a swap of two grid characters
+
+			arguments
+				i, j : int
+					grid indices
+		"""
+		self.cells[i], self.cells[j] = self.cells[j], self.cells[i]
+		lut = self.plaintext_lut
+		at_i = lut == i
+		at_j = lut == j
+		lut[at_i] = j
+		lut[at_j] = i
+
+	def encode(self, s):
+		"""
+			arguments
+				s : string
+			return
+				string
+					the label pair of every letter in the grid
+		"""
+		columns = self.dimensions[1]
+		i = self.plaintext_indices(s)
+		res = np.empty((len(i), 2), dtype = np.uint8)
+		res[:, 0] = self.label_codes[i // columns]
+		res[:, 1] = self.label_codes[i % columns]
+		return res.tobytes().decode('ascii')
+
+	def decode(self, s):
+		"""
+			arguments
+				s : string
+			return
+				string
+				None
+					if s contains a part the grid cannot decode,
+					or non-ASCII characters
+		"""
+		res = None
+		i = self.ciphertext_indices(s)
+		if i is not None:
+			res = self.cells[i].tobytes().decode('utf-32-le')
+		return res
+
+	def plaintext_indices(self, s):
+		"""
+			grid index of every ASCII letter in a string
+			that is in the grid
+
+			arguments
+				s : string
+			return
+				numpy array of int
+		"""
+		a = np.frombuffer(s.encode('ascii', 'ignore'), np.uint8)
+		res = self.plaintext_lut[a]
+		return res[res >= 0]
+
+	def ciphertext_indices(self, s):
+		"""
+			grid index of every pair of contiguous ciphertext
+			characters, paired from the start of each run
+			like string_processing.group_alpha(s, 2) 
+			and string_processing.group_digits(s, 2)
+
+			arguments
+				s : string
+			return
+				numpy array of int
+				None
+					if s has non-ASCII characters,
+					a label that is not in the grid
+					or coordinates out of range
+		"""
+		res = None
+		if s.isascii():
+			pairs = self.ciphertext_pairs(s)
+			if pairs is not None:
+				rows, columns = self.dimensions
+				r, c = pairs
+				if np.all(r < rows) and np.all(c < columns):
+					res = r * columns + c
+		return res
+
+	def ciphertext_pairs(self, s):
+		"""
+			label indices of every pair of contiguous
+			ciphertext characters
+
+			arguments
+				s : string
+					ASCII only
+			return
+				tuple of numpy arrays
+					row and column label indices
+				None
+					if a pair contains a character
+					that is not a label
+		"""
+		res = None
+		a = np.frombuffer(s.encode('ascii'), np.uint8)
+		mask = self.ciphertext_mask[a]
+		following = np.zeros(len(a), dtype = bool)
+		following[:-1] = mask[1:]
+		starts = mask.copy()
+		starts[1:] &= ~mask[:-1]
+		first = np.flatnonzero(mask & following)
+		if len(first):
+			run_starts = np.flatnonzero(starts)
+			offsets = first - run_starts[np.cumsum(starts)[first] - 1]
+			first = first[offsets % 2 == 0]
+		r = self.label_lut[a[first]]
+		c = self.label_lut[a[first + 1]]
+		if np.all(r >= 0) and np.all(c >= 0):
+			res = (r, c)
+		return res
+
+class NihilistCodec(GridCodec):
+	"""
+		properties
+			key_stream : numpy array
+				Polybius code of each keyword letter
+			codes : numpy array
+				Polybius code of each grid character
+			code_lut : numpy array
+				grid index of each decodable Polybius code, 
+				-1 for the other codes below MAX_CODE
+			letter_mask : numpy array
+				True for the ASCII letters
+	"""
+	# encoded values from MAX_CODE up are left to the grid
+	MAX_CODE = 1000
+	key_stream = None
+	codes = None
+	code_lut = None
+	letter_mask = None
+
+	def __init__(self, grid, key_stream):
+		"""
+			arguments
+				grid : NihilistGrid
+				key_stream : list of int
+					Polybius code of each keyword letter
+		"""
+		super().__init__(grid, digits, 'digits')
+		rows, columns = grid.dimensions
+		b = grid.base_index
+		self.key_stream = np.array(key_stream or [0], dtype = np.intp)
+		self.codes = np.empty(rows * columns, dtype = np.intp)
+		self.code_lut = np.full(self.MAX_CODE, -1, dtype = np.intp)
+		for r in range(b, b + rows):
+			for c in range(b, b + columns):
+				code = int('{}{}'.format(r, c))
+				i = (r - b) * columns + c - b
+				self.codes[i] = code
+				# only two digit codes read back as a row and a column
+				if 0 < r < 10 and 0 <= c < 10 and i < len(self.cells):
+					self.code_lut[code] = i
+		self.letter_mask = np.zeros(128, dtype = bool)
+		letters = ascii_letters.encode('ascii')
+		self.letter_mask[np.frombuffer(letters, np.uint8)] = True
+
+	def encode(self, s):
+		"""
+			arguments
+				s : string
+			return
+				string
+					the sum of the Polybius code and the key 
+					of every letter in the grid, keys following
+					every ASCII letter in the string
+				None
+					if a sum reaches MAX_CODE
+		"""
+		res = None
+		a = np.frombuffer(s.encode('ascii', 'ignore'), np.uint8)
+		i = self.plaintext_lut[a[self.letter_mask[a]]]
+		index = np.flatnonzero(i >= 0)
+		keys = self.key_stream[index % len(self.key_stream)]
+		values = self.codes[i[index]] + keys
+		if np.all(values < self.MAX_CODE):
+			res = format_numbers(values)
+		return res
+
+	def decode(self, s):
+		"""
+			arguments
+				s : string
+			return
+				string
+				None
+					if s contains a part the grid cannot decode,
+					or non-ASCII characters
+		"""
+		res = None
+		pairs = None
+		if s.isascii():
+			pairs = self.ciphertext_pairs(s)
+		if pairs is not None:
+			tens, units = pairs
+			index = np.arange(len(tens))
+			keys = self.key_stream[index % len(self.key_stream)]
+			values = tens * 10 + units - keys
+			if np.all(values >= 0):
+				i = self.code_lut[values]
+				if np.all(i >= 0):
+					res = self.cells[i].tobytes().decode('utf-32-le')
+		return res
+
+def format_numbers(values):
+	"""
+		decimal digits of non-negative numbers below 1000, 
+		concatenated without separators
+
+		arguments
+			values : numpy array of int
+		return
+			string
+	"""
+	widths = 1 + (values >= 10) + (values >= 100)
+	ends = np.cumsum(widths)
+	res = np.empty(ends[-1] if len(ends) else 0, dtype = np.uint8)
+	res[ends - 1] = 48 + values % 10
+	tens = widths >= 2
+	res[ends[tens] - 2] = 48 + values[tens] // 10 % 10
+	hundreds = widths == 3
+	res[ends[hundreds] - 3] = 48 + values[hundreds] // 100
+	return res.tobytes().decode('ascii')
@@ -0,0 +1,288 @@
+from string import ascii_lowercase
+import itertools
+
+import numpy as np
+
+import hill_cipher
+import ngram_score
+
+'''
+	Hill cipher key recovery
+
+	usage:
+		key = known_plaintext_key(plaintext, ciphertext)
+		for offset, key in crib_keys('attackatdawn' * 2, ciphertext):
+			print(offset, hill_cipher_decode(ciphertext, key)[0])
+		for score, key, plaintext in ciphertext_only_keys(
+			ciphertext, NgramScorer.load('english_quadgrams.txt')
+		):
+			print(score, key, plaintext)
+
+	functions:
+		known_plaintext_key() : key of a matching plaintext
+			and ciphertext
+		crib_keys() : keys placing a known piece of plaintext
+			at every offset of a ciphertext
+		best_rows() : rows of the inverse key whose letters
+			are closest to the letter frequencies of a language
+		ciphertext_only_keys() : best scoring keys combining
+			the best rows
+		chi_square() : chi-square statistic of the letters
+			decoded by many rows at once
+		text_digits() : digits of a text in the Hill alphabet
+'''
+
+# crib offsets solved together
+CHUNK_OFFSETS = 1 << 14
+# candidate rows times ciphertext blocks decoded at a time
+CHUNK_CELLS = 1 << 22
+# share of the letters given to the characters with no known frequency
+FLOOR_FREQUENCY = 1e-4
+
+def known_plaintext_key(plaintext, ciphertext,
+		block_size = 4, alphabet = ascii_lowercase):
+	"""
+		arguments
+			plaintext : string
+			ciphertext : string
+				the encoding of plaintext, or of a text
+				starting with it
+			block_size : int
+			alphabet : string
+		return
+			list of lists of int
+				the key
+			None
+				if the blocks of plaintext do not determine
+				the key mod len(alphabet), or no key encodes
+				all of them to the ciphertext
+	"""
+	res = None
+	keys = crib_keys(plaintext, ciphertext, block_size, alphabet, [0])
+	if keys:
+		res = keys[0][1]
+	return res
+
+def crib_keys(crib, ciphertext, block_size = 4,
+		alphabet = ascii_lowercase, offsets = None):
+	"""
+		solve for the key at every offset of a crib at once
+
+		the crib blocks at each block phase form the same plaintext
+		matrix, so its left inverse mod m is computed exactly once
+		per phase, and the keys of all offsets with that phase are
+		one batched product with the ciphertext blocks,
+		checked against every block of the crib
+
+		arguments
+			crib : string
+				known plaintext, at least block_size + 1 blocks long
+				when offsets is None, the blocks beyond block_size
+				ruling out the wrong offsets
+			ciphertext : string
+			block_size : int
+			alphabet : string
+			offsets : iterable of int
+				offsets of the crib in the plaintext digits,
+				every possible offset if None
+		return
+			list of tuples
+				(offset, key), for every offset where a valid key
+				encodes all of the crib's blocks to the ciphertext,
+				offsets where the crib's blocks do not determine
+				the key mod len(alphabet) are not tried
+	"""
+	res = []
+	n = block_size
+	m = len(alphabet)
+	p = text_digits(crib, n, alphabet).astype(np.int64)
+	c = text_digits(ciphertext, n, alphabet).astype(np.int64)
+	# a phase with exactly n blocks solves for a key at every offset
+	min_blocks = n
+	if offsets is None:
+		offsets = range(len(c) - len(p) + 1)
+		min_blocks = n + 1
+	offsets = np.array(
+		[o for o in offsets if 0 <= o <= len(c) - len(p)], dtype = np.intp
+	)
+	for phase in range(n):
+		# the crib's first whole block starts at phase
+		phase_offsets = offsets[(-offsets) % n == phase]
+		k = (len(p) - phase) // n
+		if len(phase_offsets) == 0 or k < min_blocks:
+			continue
+		plain_blocks = p[phase : phase + k * n].reshape(k, n)
+		inverse = hill_cipher.matrix_mod_left_inverse(plain_blocks, m)
+		if inverse is None:
+			continue
+		starts = np.arange(k) * n + phase
+		for i in range(0, len(phase_offsets), CHUNK_OFFSETS):
+			o = phase_offsets[i : i + CHUNK_OFFSETS]
+			# ciphertext blocks under the crib, for every offset
+			index = o[:, None, None] + starts[None, :, None]
+			index = index + np.arange(n)[None, None, :]
+			cipher_blocks = c[index]
+			# rows of plaintext times the transposed key
+			# are the rows of ciphertext
+			key_t = np.einsum('ij,ojk->oik', inverse, cipher_blocks) % m
+			encoded = np.einsum('ej,ojk->oek', plain_blocks, key_t) % m
+			match = np.all(encoded == cipher_blocks, axis = (1, 2))
+			for j in np.flatnonzero(match):
+				key = key_t[j].T
+				if hill_cipher.valid_hill_key(key, m):
+					res.append((int(o[j]), key.astype(int).tolist()))
+	res.sort()
+	return res
+
+def ciphertext_only_keys(ciphertext, scorer, block_size = 4,
+		alphabet = ascii_lowercase, rows = None, top = 10,
+		frequencies = None):
+	"""
+		every ordering of block_size of the best rows forms
+		an inverse key, tried if it is invertible, as the letter
+		frequencies of a row do not depend on its position
+
+		arguments
+			ciphertext : string
+			scorer : NgramScorer
+				ranks the keys, n-grams of 2 or more letters
+				telling the orders of the same rows apart
+			block_size : int
+			alphabet : string
+			rows : int
+				number of best rows combined, 3 * block_size if None
+			top : int
+				number of keys kept
+			frequencies : dict {character : frequency}
+				as passed to best_rows()
+		return
+			list of tuples
+				(score, key, plaintext), best first
+	"""
+	n = block_size
+	m = len(alphabet)
+	cipher = identity_cipher(n, alphabet)
+	cipher_blocks = ciphertext_blocks(cipher, ciphertext)
+	candidates = [
+		row for _, row in best_rows(
+			ciphertext, n, alphabet, rows or 3 * n, frequencies
+		)
+	]
+	inverses = (np.array(p) for p in itertools.permutations(candidates, n))
+	inverses = (d for d in inverses if hill_cipher.valid_hill_key(d, m))
+	ranked = ngram_score.rank(
+		ciphertext, inverses,
+		lambda _, d: cipher.digits_to_chars(cipher_blocks.dot(d.T).ravel()),
+		scorer, top
+	)
+	return [
+		(score, hill_cipher.matrix_mod_inverse(d, m).tolist(), plaintext)
+		for score, d, plaintext in ranked
+	]
+
+def best_rows(ciphertext, block_size = 4, alphabet = ascii_lowercase,
+		top = 8, frequencies = None):
+	"""
+		search every row of the inverse key on its own,
+		all m ** block_size candidates decoding the ciphertext
+		blocks in one matrix product per chunk
+
+		arguments
+			ciphertext : string
+			block_size : int
+			alphabet : string
+			top : int
+				number of rows kept
+			frequencies : dict {character : frequency}
+				of the plaintext language, English letters if None
+		return
+			list of tuples
+				(chi-square, row), lowest first
+	"""
+	n = block_size
+	m = len(alphabet)
+	cipher = identity_cipher(n, alphabet)
+	cipher_blocks = ciphertext_blocks(cipher, ciphertext)
+	expected = digit_frequencies(cipher, alphabet, frequencies)
+	blocks_t = cipher_blocks.T.astype(np.float32)
+	powers = m ** np.arange(n - 1, -1, -1, dtype = np.int64)
+	chunk = max(CHUNK_CELLS // max(len(cipher_blocks), 1), 1)
+	best_ids = np.zeros(0, dtype = np.int64)
+	best_stats = np.zeros(0, dtype = np.float64)
+	# the zero row decodes every block to the same digit
+	for start in range(1, m ** n, chunk):
+		ids = np.arange(start, min(start + chunk, m ** n), dtype = np.int64)
+		stats = chi_square(ids[:, None] // powers % m, blocks_t, expected, m)
+		best_ids = np.concatenate((best_ids, ids))
+		best_stats = np.concatenate((best_stats, stats))
+		if len(best_ids) > top:
+			keep = np.argpartition(best_stats, top - 1)[:top]
+			best_ids = best_ids[keep]
+			best_stats = best_stats[keep]
+	order = np.lexsort((best_ids, best_stats))
+	return [
+		(float(best_stats[i]), (best_ids[i] // powers % m).tolist())
+		for i in order
+	]
+
+def chi_square(rows, blocks_t, expected, m):
+	"""
+		arguments
+			rows : numpy array of int
+				one candidate row per row
+			blocks_t : numpy array of float32
+				transposed ciphertext blocks, exact as long as
+				block_size * (m - 1) ** 2 fits in 24 bits
+			expected : numpy array of float
+				frequency of each digit, summing to 1
+			m : int
+		return
+			numpy array of float
+				chi-square statistic of the digits each row
+				decodes the blocks to
+	"""
+	sums = rows.astype(np.float32).dot(blocks_t).astype(np.int32)
+	k, l = sums.shape
+	# a lookup of the remainders is faster than the modulo of every sum
+	remainders = np.arange(rows.shape[1] * (m - 1) ** 2 + 1, dtype = np.intp)
+	remainders %= m
+	digits = remainders[sums]
+	digits += np.arange(k)[:, None] * m
+	counts = np.bincount(digits.ravel(), minlength = k * m).reshape(k, m)
+	# sum of (count - l * f) ** 2 / (l * f)
+	return (counts.astype(np.float64) ** 2).dot(1 / expected) / max(l, 1) - l
+
+def digit_frequencies(cipher, alphabet, frequencies = None):
+	# frequency of the character of each digit, summing to 1
+	if frequencies is None:
+		frequencies = ngram_score.ENGLISH_LETTER_FREQUENCIES
+	res = np.zeros(len(alphabet), dtype = np.float64)
+	for c in alphabet:
+		res[cipher.digit_lut[ord(c)]] += frequencies.get(c, 0)
+	res = np.maximum(res, FLOOR_FREQUENCY * max(res.sum(), 1))
+	return res / res.sum()
+
+def ciphertext_blocks(cipher, ciphertext):
+	# ciphertext digits as an (n_blocks x block_size) matrix
+	digits = hill_cipher.pad_blocks(
+		cipher.chars_to_digits(ciphertext), cipher.block_size
+	)
+	return digits.astype(np.int64).reshape(-1, cipher.block_size)
+
+def identity_cipher(block_size, alphabet):
+	# a cipher converting characters to digits and back
+	identity = np.eye(block_size, dtype = int).tolist()
+	return hill_cipher.HillCipher(identity, block_size, alphabet)
+
+def text_digits(text, block_size = 4, alphabet = ascii_lowercase):
+	"""
+		arguments
+			text : string
+			block_size : int
+			alphabet : string
+		return
+			numpy array of int
+				digit of every character of the text
+				in the alphabet, as HillCipher converts them
+	"""
+	return identity_cipher(block_size, alphabet).chars_to_digits(text)
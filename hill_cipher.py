@@ -1,6 +1,13 @@
 from string import ascii_lowercase
+from functools import lru_cache
+from math import gcd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np 
-from fractions import gcd
+
+import instrumentation
+import parallel
+import string_processing
 
 '''
 	encode/decode messages using the Hill cipher.
@@ -8,48 +15,435 @@ from fractions import gcd
 	usage:
 	ciphertext, key = hill_cipher_encode('secret message')
 	plaintext, key = hill_cipher_decode(ciphertext, key)
+
+	or, to reuse the key setup across many messages:
+	cipher = HillCipher(key)
+	ciphertext = cipher.encode('secret message')
+	plaintext = cipher.decode(ciphertext)
+
+	or, to spread a large message over all cores:
+	ciphertext = cipher.encode_parallel('secret message')
+
+	or, to stream a file without reading it into memory:
+	with open(path) as f:
+		for chunk in cipher.encode_stream(f):
+			out.write(chunk)
+
+	or, to encode chunks of text as they arrive:
+	for chunk in cipher.encode_iter(chunks):
+		send(chunk)
 '''
+
+# number of blocks multiplied by the key matrix at a time
+CHUNK_BLOCKS = 1 << 16
+# number of characters converted to digits at a time
+CHUNK_CHARS = 1 << 20
+
 def hill_cipher_encode(message, key = None, 
 		block_size = 4, alphabet = ascii_lowercase):
 	kwargs = {
-		'mode' : 'encode',
-		'f_transform_block' : encode_block
+		'mode' : 'encode'
 	}
 	return hill_cipher(message, key, block_size, alphabet, **kwargs)
 
 def hill_cipher_decode(ciphertext, key, 
 		block_size = 4, alphabet = ascii_lowercase):
 	kwargs = {
-		'mode' : 'decode',
-		'f_transform_block' : decode_block
+		'mode' : 'decode'
 	}
 	return hill_cipher(ciphertext, key, block_size, alphabet, **kwargs)
 
+def hill_cipher_encode_stream(source, key = None, 
+		block_size = 4, alphabet = ascii_lowercase):
+	cipher = wrapper_cipher(key, block_size, alphabet)
+	return cipher.encode_stream(source), copy_key(cipher.key)
+
+def hill_cipher_decode_stream(source, key, 
+		block_size = 4, alphabet = ascii_lowercase):
+	cipher = wrapper_cipher(key, block_size, alphabet)
+	return cipher.decode_stream(source), copy_key(cipher.key)
+
 def hill_cipher(text, key, block_size, alphabet, **kwargs):
 	mode = kwargs.get('mode')
-	f_transform_block = kwargs.get('f_transform_block')
-	charset_list = list(alphabet)
-	len_charset = len(charset_list)
 	# results
 	res = None
-	key_matrix = hill_key(block_size, len_charset, key)
-	if key_matrix is not None:
-		# list of characters encoded to digits
-		digits = chars_to_digits(text, charset_list)
-		# split message to blocks
-		digit_blocks = blocks(digits, block_size)
-		# blocks of characters as digits
-		transformed_digits = []
-		for block in digit_blocks:
-			block = f_transform_block(block, key_matrix, len_charset)
-			transformed_digits.extend(block)
-		# convert digits to string
-		res = ''.join(digits_to_chars(transformed_digits, charset_list))
-		# convert key to list of lists
-		key = key_matrix.tolist()
+	cipher = wrapper_cipher(key, block_size, alphabet)
+	if cipher.key_matrix is not None:
+		if mode == 'decode':
+			res = cipher.decode(text)
+		else:
+			res = cipher.encode(text)
+		key = copy_key(cipher.key)
 	# return result string and key
 	return res, key
 
+def wrapper_cipher(key, block_size, alphabet):
+	# HillCipher of the functional wrappers, shared between calls
+	# with the same key, new for every generated key
+	res = None
+	if key is None:
+		res = HillCipher(key, block_size, alphabet)
+	else:
+		try:
+			rows = tuple(tuple(row) for row in key)
+			res = cached_hill_cipher(rows, block_size, alphabet)
+		except TypeError:
+			res = HillCipher(key, block_size, alphabet)
+	return res
+
+@lru_cache(maxsize = 64)
+def cached_hill_cipher(rows, block_size, alphabet):
+	return HillCipher([list(row) for row in rows], block_size, alphabet)
+
+def copy_key(key):
+	# the key of a shared HillCipher, safe to hand out
+	res = key
+	if key is not None:
+		res = [list(row) for row in key]
+	return res
+
+class HillCipher():
+	"""
+		properties
+			key : list of lists of int
+				the validated key, None if the key is invalid
+			key_matrix : numpy array
+			inverse_matrix : numpy array
+				modular inverse of the key matrix,
+				computed on the first decode
+			block_size : int
+			charset_list : list of string
+			len_charset : int
+			digit_lut : numpy array
+				digit of each codepoint in the alphabet
+			in_charset : numpy array
+				True for each codepoint in the alphabet
+			charset : numpy array
+				codepoint of each digit
+	"""
+	key = None
+	key_matrix = None
+	# row echelon form of the key, completed to its inverse on demand
+	__echelon = None
+	__inverse_matrix = None
+	block_size = None
+	charset_list = None
+	len_charset = None
+	digit_lut = None
+	in_charset = None
+	charset = None
+
+	def __init__(self, key = None, block_size = 4, alphabet = ascii_lowercase):
+		"""
+			arguments
+				key : list of lists of int
+					a random key is generated if None
+				block_size : int
+				alphabet : string
+		"""
+		self.block_size = block_size
+		self.charset_list = list(alphabet)
+		self.len_charset = len(self.charset_list)
+		self.key_matrix, self.__echelon = hill_key_echelon(
+			block_size, self.len_charset, key
+		)
+		if self.key_matrix is not None:
+			self.key = self.key_matrix.tolist()
+		self.digit_lut, self.in_charset = charset_lut(self.charset_list)
+		self.charset = np.array(
+			list(map(ord, self.charset_list)), dtype = np.uint32
+		)
+
+	@property
+	def inverse_matrix(self):
+		if self.__inverse_matrix is None and self.__echelon is not None:
+			self.__inverse_matrix = mod_back_substitute(
+				self.__echelon, self.len_charset
+			)
+		return self.__inverse_matrix
+
+	def encode(self, message):
+		"""
+			arguments
+				message : string
+			return
+				string
+				None
+					if the key is invalid
+		"""
+		return self.transform(message, self.key_matrix)
+
+	def decode(self, ciphertext):
+		"""
+			arguments
+				ciphertext : string
+			return
+				string
+				None
+					if the key is invalid
+		"""
+		return self.transform(ciphertext, self.inverse_matrix)
+
+	def encode_stream(self, source, chunk_size = CHUNK_CHARS):
+		"""
+			arguments
+				source : string, bytes, file object 
+					or iterable of chunks
+				chunk_size : int
+			return
+				generator of string
+					encoded chunks
+				None
+					if the key is invalid
+		"""
+		return self.transform_stream(source, self.key_matrix, chunk_size)
+
+	def decode_stream(self, source, chunk_size = CHUNK_CHARS):
+		"""
+			arguments
+				source : string, bytes, file object 
+					or iterable of chunks
+				chunk_size : int
+			return
+				generator of string
+					decoded chunks
+				None
+					if the key is invalid
+		"""
+		return self.transform_stream(
+			source, self.inverse_matrix, chunk_size
+		)
+
+	def encode_iter(self, chunks):
+		"""
+			arguments
+				chunks : iterable of strings
+			return
+				generator of string
+					encoded chunks, a block split across chunks 
+					encoded with the chunk completing it
+				None
+					if the key is invalid
+		"""
+		res = None
+		if self.key_matrix is not None:
+			res = self.transform_chunks(chunks, self.key_matrix)
+		return res
+
+	def decode_iter(self, chunks):
+		"""
+			arguments
+				chunks : iterable of strings
+			return
+				generator of string
+					decoded chunks, a block split across chunks 
+					decoded with the chunk completing it
+				None
+					if the key is invalid
+		"""
+		res = None
+		if self.inverse_matrix is not None:
+			res = self.transform_chunks(chunks, self.inverse_matrix)
+		return res
+
+	def encode_parallel(self, message, workers = None):
+		"""
+			encode() with the text split across worker processes
+
+			arguments
+				message : string
+				workers : int
+					None for one worker per CPU
+			return
+				string
+				None
+					if the key is invalid
+		"""
+		return self.transform_parallel(message, self.key_matrix, workers)
+
+	def decode_parallel(self, ciphertext, workers = None):
+		"""
+			decode() with the text split across worker processes
+
+			arguments
+				ciphertext : string
+				workers : int
+					None for one worker per CPU
+			return
+				string
+				None
+					if the key is invalid
+		"""
+		return self.transform_parallel(
+			ciphertext, self.inverse_matrix, workers
+		)
+
+	def transform_parallel(self, text, matrix, workers):
+		# every worker converts its own slice of the text to digits 
+		# in shared memory, the parent packs the slices together and 
+		# pads the last block, then every worker transforms its own 
+		# range of blocks and converts them back to characters
+		res = None
+		if matrix is not None:
+			workers = parallel.worker_count(workers)
+			if workers == 1 or len(text) < workers * self.block_size:
+				res = self.transform(text, matrix)
+			else:
+				bounds = np.linspace(0, len(text), workers + 1, dtype = int)
+				bounds = list(zip(bounds, bounds[1:]))
+				# lower() turns U+0130 into two characters
+				capacities = [
+					stop - start + text.count('\u0130', start, stop) 
+					for start, stop in bounds
+				]
+				offsets = np.cumsum([0] + capacities)
+				size = int(offsets[-1]) + self.block_size
+				dtype = self.digit_lut.dtype
+				shm = shared_memory.SharedMemory(
+					create = True, size = size * dtype.itemsize
+				)
+				try:
+					with ProcessPoolExecutor(workers, 
+							initializer = init_worker, 
+							initargs = (self, shm.name, size)) as pool:
+						futures = [
+							pool.submit(
+								shared_chars_to_digits, 
+								text[start : stop], int(offset)
+							)
+							for (start, stop), offset in zip(bounds, offsets)
+						]
+						counts = [f.result() for f in futures]
+						digits = np.ndarray(size, dtype, buffer = shm.buf)
+						n = 0
+						for offset, count in zip(offsets, counts):
+							if offset > n:
+								digits[n : n + count] = digits[
+									offset : offset + count
+								]
+							n += count
+						# pad in place, like pad_blocks()
+						n_blocks = -(-n // self.block_size)
+						padded = n_blocks * self.block_size
+						if padded > n:
+							digits[n : padded] = digits[n - 1]
+						del digits
+						block_bounds = np.linspace(
+							0, n_blocks, workers + 1, dtype = int
+						)
+						futures = [
+							pool.submit(
+								shared_blocks_to_chars, 
+								int(start), int(stop), matrix
+							) 
+							for start, stop 
+							in zip(block_bounds, block_bounds[1:])
+							if stop > start
+						]
+						res = ''.join(f.result() for f in futures)
+				finally:
+					shm.close()
+					shm.unlink()
+		return res
+
+	def transform_stream(self, source, matrix, chunk_size):
+		res = None
+		if matrix is not None:
+			chunks = string_processing.text_chunks(source, chunk_size)
+			res = self.transform_chunks(chunks, matrix)
+		return res
+
+	def transform_chunks(self, chunks, matrix):
+		# digits of a partial block are carried over to the next chunk,
+		# the last block is padded at the end of the stream
+		n = self.block_size
+		carry = np.zeros(0, dtype = self.digit_lut.dtype)
+		for chunk in chunks:
+			digits = self.chars_to_digits(chunk)
+			if len(carry):
+				digits = np.concatenate((carry, digits))
+			whole = len(digits) - len(digits) % n
+			carry = digits[whole:]
+			if whole:
+				digits = transform_blocks(
+					digits[:whole], matrix, self.len_charset
+				)
+				yield self.digits_to_chars(digits)
+		if len(carry):
+			digits = pad_blocks(carry, n)
+			digits = transform_blocks(digits, matrix, self.len_charset)
+			yield self.digits_to_chars(digits)
+
+	def transform(self, text, matrix):
+		res = None
+		if matrix is not None:
+			# characters encoded to digits
+			with instrumentation.stage(self, 'chars_to_digits', text):
+				digits = self.chars_to_digits(text)
+			# pad the digits to a whole number of blocks
+			digits = pad_blocks(digits, self.block_size)
+			# transform all blocks
+			with instrumentation.stage(self, 'transform_blocks') as stage:
+				digits = transform_blocks(digits, matrix, self.len_charset)
+				stage.output(None, len(digits) // self.block_size)
+			# convert digits to string
+			with instrumentation.stage(self, 'digits_to_chars') as stage:
+				res = self.digits_to_chars(digits)
+				stage.output(res)
+		return res
+
+	def chars_to_digits(self, chars):
+		"""
+			chars_to_digits() as a numpy array
+
+			arguments
+				chars : string
+			return
+				numpy array of int
+		"""
+		res = list(self.digit_chunks(chars))
+		if res:
+			res = np.concatenate(res)
+		else:
+			res = np.zeros(0, dtype = self.digit_lut.dtype)
+		return res
+
+	def digit_chunks(self, chars):
+		# digits of CHUNK_CHARS characters at a time
+		lut_size = len(self.digit_lut)
+		for i in range(0, len(chars), CHUNK_CHARS):
+			chunk = chars[i : i + CHUNK_CHARS].lower()
+			codes = np.frombuffer(chunk.encode('utf-32-le'), np.uint32)
+			codes = codes[codes < lut_size]
+			yield self.digit_lut[codes[self.in_charset[codes]]]
+
+	def digits_to_chars(self, digits):
+		"""
+			digits_to_chars() joined to a string
+
+			arguments
+				digits : numpy array of int
+			return
+				string
+		"""
+		res = []
+		for i in range(0, len(digits), CHUNK_CHARS):
+			chunk = digits[i : i + CHUNK_CHARS] % self.len_charset
+			res.append(self.charset[chunk].tobytes().decode('utf-32-le'))
+		return ''.join(res)
+
+def transform_blocks(digits, matrix, len_charset):
+	# digits as an (n_blocks x block_size) matrix, 
+	# multiplied by the transposed key matrix chunk by chunk
+	n = matrix.shape[0]
+	digit_blocks = digits.reshape(-1, n)
+	res = np.empty_like(digit_blocks)
+	matrix_t = matrix.T.astype(np.int64)
+	for i in range(0, len(digit_blocks), CHUNK_BLOCKS):
+		chunk = digit_blocks[i : i + CHUNK_BLOCKS].astype(np.int64)
+		res[i : i + CHUNK_BLOCKS] = chunk.dot(matrix_t) % len_charset
+	return res.reshape(-1)
+
 def encode_block(block, key_matrix, len_charset):
 	block_vector = np.array(block)
 	encoded_digits = key_matrix.dot(block_vector) % len_charset
@@ -77,6 +471,14 @@ def blocks(s, block_size):
 		res = [s[i : i + block_size] for i in range(0, l, block_size)]
 	return res
 
+def pad_blocks(digits, block_size):
+	# pad an array of digits by repeating the last digit, like blocks()
+	m = len(digits) % block_size
+	if m > 0:
+		padding = np.full(block_size - m, digits[-1], dtype = digits.dtype)
+		digits = np.concatenate((digits, padding))
+	return digits
+
 def chars_to_digits(chars, charset_list):
 	charset = set(charset_list)
 	digits = [
@@ -90,37 +492,67 @@ def digits_to_chars(digits, charset_list):
 	chars = [charset_list[i % len_charset] for i in digits]
 	return chars
 
+def charset_lut(charset_list):
+	# digit of every codepoint in the charset, as computed 
+	# by chars_to_digits(), and a mask of the codepoints in the charset
+	len_charset = len(charset_list)
+	lut_size = max(map(ord, charset_list)) + 1
+	lut = np.zeros(lut_size, dtype = digit_dtype(len_charset))
+	in_charset = np.zeros(lut_size, dtype = bool)
+	for i, c in reversed(list(enumerate(charset_list))):
+		lut[ord(c)] = (ord(c) - 97 if c.isalpha() else i) % len_charset
+		in_charset[ord(c)] = True
+	return lut, in_charset
+
+def digit_dtype(len_charset):
+	# smallest unsigned type that holds a digit
+	return np.uint8 if len_charset <= 256 else np.uint32
+
 """
 	keys
 """
 def hill_key(n, len_charset, key = None):
+	key_matrix, echelon = hill_key_echelon(n, len_charset, key)
+	return key_matrix
+
+def hill_key_echelon(n, len_charset, key = None):
+	# hill_key() and the row echelon form of the key from the 
+	# elimination that checks it, for mod_back_substitute()
 	key_matrix = None
+	echelon = None
 	if key is None:
 		# generate a key
 		key_matrix = gen_hill_key(n, len_charset)
+		det, echelon = mod_row_echelon(key_matrix, len_charset)
 	else:
 		# check if the key is square
 		if all(len(row) == len(key) == n for row in key):
 			# convert the key to numpy matrix
 			key_matrix_tmp = np.array(key)
-			if valid_hill_key(key_matrix_tmp, len_charset):
+			det, echelon = mod_row_echelon(key_matrix_tmp, len_charset)
+			if coprime(det, len_charset):
 				key_matrix = key_matrix_tmp.astype(int)
-	return key_matrix
+			else:
+				echelon = None
+	return key_matrix, echelon
 
 def gen_hill_key(n, len_charset):
-	key_matrix = np.random.randint(len_charset, size = (n, n))
-	while not valid_hill_key(key_matrix, len_charset):
-		key_matrix = np.random.randint(len_charset, size = (n, n))
-	return key_matrix
+	# product of a random permutation, a unit lower triangular matrix, 
+	# a diagonal matrix of units and a unit upper triangular matrix,
+	# invertible mod len_charset by construction
+	m = len_charset
+	units = [u for u in range(1, m) if coprime(u, m)] or [1]
+	lower = np.tril(np.random.randint(m, size = (n, n)), -1)
+	upper = np.triu(np.random.randint(m, size = (n, n)), 1)
+	np.fill_diagonal(lower, 1)
+	np.fill_diagonal(upper, np.random.choice(units, size = n))
+	key_matrix = lower.astype(np.int64).dot(upper) % m
+	key_matrix = key_matrix[np.random.permutation(n)]
+	return key_matrix.astype(int)
 
 def valid_hill_key(key_matrix, len_charset):
-	res = False
-	det = np.linalg.det(key_matrix)
-	if det != 0:
-		if coprime(det, len_charset):
-			if int_mod_inverse(det, len_charset) is not None:
-				res = True
-	return res
+	det = matrix_mod_det(key_matrix, len_charset)
+	return coprime(det, len_charset)
 
 """
 	math
@@ -128,12 +560,96 @@ def valid_hill_key(key_matrix, len_charset):
 def coprime(a, b):
 	return gcd(a, b) == 1
 
+def matrix_mod_det(mat, m):
+	det, mat_inv = mod_row_reduce(mat, m, inverse = False)
+	return det
+
 def matrix_mod_inverse(mat, m):
-	det = np.linalg.det(mat)
-	det_mod_inv = int_mod_inverse(det, m)
-	mat_inv = np.linalg.inv(mat)
-	cofactors = mat_inv * det
-	return np.rint(cofactors * det_mod_inv % m).astype(int)
+	det, mat_inv = mod_row_reduce(mat, m)
+	return mat_inv
+
+def mod_row_reduce(mat, m, inverse = True):
+	# exact Gaussian elimination over the integers mod m,
+	# returns the determinant mod m and, if requested and it exists, 
+	# the inverse mod m
+	det, a = mod_row_echelon(mat, m)
+	mat_inv = None
+	if inverse and coprime(det, m):
+		mat_inv = mod_back_substitute(a, m)
+	return det, mat_inv
+
+def mod_row_echelon(mat, m):
+	# forward pass of mod_row_reduce(), returns the determinant mod m 
+	# and mat in row echelon form next to the same row operations 
+	# applied to the identity
+	mat = np.asarray(mat, dtype = np.int64)
+	n = len(mat)
+	a = np.zeros((n, 2 * n), dtype = np.int64)
+	a[:, :n] = mat % m
+	a[:, n:] = np.eye(n, dtype = np.int64)
+	sign = 1
+	for j in range(n):
+		units = np.flatnonzero(np.gcd(a[j:, j], m) == 1)
+		if len(units):
+			# swap a unit to the pivot and clear the column below it
+			i = j + units[0]
+			if i != j:
+				a[[j, i]] = a[[i, j]]
+				sign = -sign
+			f = a[j + 1:, j] * int_mod_inverse(int(a[j, j]), m) % m
+			a[j + 1:] = (a[j + 1:] - np.outer(f, a[j])) % m
+		else:
+			# no unit in the column, reduce it to its gcd 
+			# with the Euclidean algorithm on whole rows
+			for i in np.flatnonzero(a[j + 1:, j]) + j + 1:
+				while a[i, j]:
+					q = a[j, j] // a[i, j]
+					a[j] = (a[j] - q * a[i]) % m
+					a[[j, i]] = a[[i, j]]
+					sign = -sign
+	det = sign % m
+	for j in range(n):
+		det = det * int(a[j, j]) % m
+	return det, a
+
+def mod_back_substitute(a, m):
+	# backward pass of mod_row_reduce(), the inverse mod m 
+	# from the output of mod_row_echelon() for an invertible matrix
+	a = a.copy()
+	n = len(a)
+	for j in reversed(range(n)):
+		a[j] = a[j] * int_mod_inverse(int(a[j, j]), m) % m
+		a[:j] = (a[:j] - np.outer(a[:j, j], a[j])) % m
+	return a[:, n:].astype(int)
+
+def matrix_mod_left_inverse(mat, m):
+	# L with L.dot(mat) equal to the identity mod m, for a k x n
+	# matrix with k >= n, None if there is none
+	mat = np.asarray(mat, dtype = np.int64)
+	k, n = mat.shape
+	a = np.zeros((k, n + k), dtype = np.int64)
+	a[:, :n] = mat % m
+	a[:, n:] = np.eye(k, dtype = np.int64)
+	res = None
+	for j in range(min(n, k)):
+		units = np.flatnonzero(np.gcd(a[j:, j], m) == 1)
+		if len(units):
+			i = j + units[0]
+			a[[j, i]] = a[[i, j]]
+			f = a[j + 1:, j] * int_mod_inverse(int(a[j, j]), m) % m
+			a[j + 1:] = (a[j + 1:] - np.outer(f, a[j])) % m
+		else:
+			for i in np.flatnonzero(a[j + 1:, j]) + j + 1:
+				while a[i, j]:
+					q = a[j, j] // a[i, j]
+					a[j] = (a[j] - q * a[i]) % m
+					a[[j, i]] = a[[i, j]]
+	if k >= n and all(coprime(int(a[j, j]), m) for j in range(n)):
+		for j in reversed(range(n)):
+			a[j] = a[j] * int_mod_inverse(int(a[j, j]), m) % m
+			a[:j] = (a[:j] - np.outer(a[:j, j], a[j])) % m
+		res = a[:n, n:]
+	return res
 
 def int_mod_inverse(a, m):
 	g, x, y = egcd(a, m)
@@ -148,3 +664,49 @@ def egcd(a, b):
 	else:
 		g, y, x = egcd(b % a, a)
 		return (g, x - (b // a) * y, y)
+
+"""
+	workers
+"""
+# (cipher, shared memory name, number of digits) of the current process
+worker_state = None
+
+def init_worker(cipher, name, size):
+	global worker_state
+	worker_state = (cipher, name, size)
+
+def shared_chars_to_digits(text, offset):
+	# digits of a slice of text written to the shared digits 
+	# from offset on, returns their number
+	cipher, name, size = worker_state
+	shm = shared_memory.SharedMemory(name = name)
+	try:
+		digits = np.ndarray(
+			size, dtype = cipher.digit_lut.dtype, buffer = shm.buf
+		)
+		res = 0
+		for chunk in cipher.digit_chunks(text):
+			digits[offset + res : offset + res + len(chunk)] = chunk
+			res += len(chunk)
+		del digits
+	finally:
+		shm.close()
+	return res
+
+def shared_blocks_to_chars(start, stop, matrix):
+	# blocks start to stop of the shared digits, 
+	# transformed and converted to characters
+	cipher, name, size = worker_state
+	shm = shared_memory.SharedMemory(name = name)
+	try:
+		n = matrix.shape[0]
+		digits = np.ndarray(
+			size, dtype = cipher.digit_lut.dtype, buffer = shm.buf
+		)
+		res = cipher.digits_to_chars(transform_blocks(
+			digits[start * n : stop * n], matrix, cipher.len_charset
+		))
+		del digits
+	finally:
+		shm.close()
+	return res
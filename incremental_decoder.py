@@ -0,0 +1,197 @@
+import numpy as np
+
+import grid_ciphers
+
+'''
+	incremental decoding for key search
+
+	decoders keeping the plaintext of one ciphertext in step with
+	the mutations of its grid (CipherGrid.mutate(), swap_letters(),
+	swap_rows(), swap_columns(), reflect() and undo()), decoding again
+	only the parts of the ciphertext the swapped characters affect
+
+	usage:
+		grid = grid_ciphers.PlayfairGrid(guess)
+		decoder = incremental_decoder(grid, ciphertext)
+		decoder.update(grid.swap_letters('a', 'q'))
+		if scorer.score(decoder.plaintext()) < best:
+			decoder.update(grid.undo())
+
+	CoordinateDecoder class : Polybius, ADFGX and ADFGVX
+	PlayfairDecoder class : Playfair
+
+	functions:
+		incremental_decoder() : decoder for a grid and a ciphertext
+'''
+
+class CoordinateDecoder():
+	"""
+		ciphers decoding every part to the character
+		at its coordinates, where a swap only changes
+		the letters decoded from the swapped cells
+
+		properties
+			grid : CipherGrid
+			codes : numpy array
+				codepoint of each plaintext letter
+			positions : list of numpy arrays
+				plaintext positions decoded from each grid cell
+			finish : function
+				applied to the decoded string
+	"""
+	grid = None
+	codes = None
+	positions = None
+	finish = None
+
+	def __init__(self, grid, indices, finish = None):
+		"""
+			arguments
+				grid : CipherGrid
+				indices : numpy array of int
+					grid index of each ciphertext part
+				finish : function
+		"""
+		self.grid = grid
+		self.finish = finish
+		cells = np.array([ord(c) for c in grid.s], dtype = np.uint32)
+		self.codes = cells[indices]
+		order = np.argsort(indices, kind = 'stable')
+		bounds = np.searchsorted(indices[order], np.arange(len(cells) + 1))
+		self.positions = [
+			order[bounds[i]:bounds[i + 1]] for i in range(len(cells))
+		]
+
+	def update(self, swaps):
+		"""
+			arguments
+				swaps : list of tuples
+					pairs of coordinates swapped in the grid
+		"""
+		for p in {p for pair in swaps for p in pair}:
+			i = grid_index(self.grid, p)
+			self.codes[self.positions[i]] = ord(grid_cell(self.grid, p))
+
+	def plaintext(self):
+		res = self.codes.tobytes().decode('utf-32-le')
+		if self.finish is not None:
+			res = self.finish(res)
+		return res
+
+class PlayfairDecoder():
+	"""
+		each distinct digraph is decoded once, and again after
+		a swap only if one of its letters or one of the letters
+		it decodes to was moved
+
+		properties
+			grid : PlayfairGrid
+			digraphs : list of strings
+				distinct digraphs of the ciphertext
+			input_codes : numpy array
+				codepoints of each digraph
+			output_codes : numpy array
+				codepoints each digraph decodes to
+			positions : list of numpy arrays
+				ciphertext parts of each digraph
+			codes : numpy array
+				codepoints of each decoded part
+	"""
+	grid = None
+	digraphs = None
+	input_codes = None
+	output_codes = None
+	positions = None
+	codes = None
+
+	def __init__(self, grid, ciphertext):
+		"""
+			arguments
+				grid : PlayfairGrid
+				ciphertext : string
+		"""
+		self.grid = grid
+		parts = grid.ciphertext_to_parts(grid.translator(ciphertext))
+		ids = {}
+		part_ids = np.array(
+			[ids.setdefault(p, len(ids)) for p in parts], dtype = np.intp
+		)
+		self.digraphs = list(ids)
+		self.input_codes = np.array(
+			[[ord(a), ord(b)] for a, b in self.digraphs], dtype = np.uint32
+		).reshape(-1, 2)
+		self.output_codes = np.zeros_like(self.input_codes)
+		order = np.argsort(part_ids, kind = 'stable')
+		bounds = np.searchsorted(
+			part_ids[order], np.arange(len(self.digraphs) + 1)
+		)
+		self.positions = [
+			order[bounds[i]:bounds[i + 1]] for i in range(len(self.digraphs))
+		]
+		self.codes = np.zeros((len(parts), 2), dtype = np.uint32)
+		self.decode_digraphs(range(len(self.digraphs)))
+
+	def update(self, swaps):
+		"""
+			arguments
+				swaps : list of tuples
+					pairs of coordinates swapped in the grid
+		"""
+		moved = np.array(
+			[ord(grid_cell(self.grid, p)) for pair in swaps for p in pair],
+			dtype = np.uint32
+		)
+		affected = np.isin(self.input_codes, moved).any(axis = 1)
+		affected |= np.isin(self.output_codes, moved).any(axis = 1)
+		self.decode_digraphs(np.flatnonzero(affected).tolist())
+
+	def decode_digraphs(self, ids):
+		for i in ids:
+			a, b = self.grid.decode_part(self.digraphs[i])
+			self.output_codes[i] = (ord(a), ord(b))
+			self.codes[self.positions[i]] = self.output_codes[i]
+
+	def plaintext(self):
+		res = self.codes.tobytes().decode('utf-32-le')
+		return self.grid.decoded_parts_to_string([res])
+
+def incremental_decoder(grid, ciphertext):
+	"""
+		arguments
+			grid : CipherGrid
+			ciphertext : string
+		return
+			CoordinateDecoder or PlayfairDecoder
+			None
+				if the cipher has no incremental decoder,
+				as Bifid and Nihilist, where every part depends
+				on the whole grid, or the grid cannot decode
+				the ciphertext
+	"""
+	res = None
+	if isinstance(grid, grid_ciphers.PlayfairGrid):
+		res = PlayfairDecoder(grid, ciphertext)
+	elif isinstance(grid, grid_ciphers.ADFGVXGrid):
+		codec = grid.grid_codec()
+		indices = codec.ciphertext_indices(grid.untranspose(ciphertext))
+		if indices is not None:
+			res = CoordinateDecoder(
+				grid, indices,
+				lambda s: s.strip(grid.decoded_padding())
+			)
+	elif type(grid) is grid_ciphers.PolybiusGrid:
+		codec = grid.grid_codec()
+		if codec is not None:
+			indices = codec.ciphertext_indices(ciphertext)
+			if indices is not None:
+				res = CoordinateDecoder(grid, indices)
+	return res
+
+def grid_index(grid, p):
+	b = grid.base_index
+	return (p[0] - b) * len(grid.matrix[0]) + p[1] - b
+
+def grid_cell(grid, p):
+	# the character at p, where PlayfairGrid.locate() takes pairs
+	b = grid.base_index
+	return grid.matrix[p[0] - b][p[1] - b]
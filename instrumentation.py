@@ -0,0 +1,206 @@
+from threading import Lock
+import time
+
+'''
+	instrumentation
+
+	opt-in wall time, part counts and sizes in and out of every
+	stage of the ciphers, aggregated per cipher class and stage,
+	disabled by default
+
+	counters are kept per process, stages run in the workers
+	of encode_many() and decode_many() are not collected
+
+	usage:
+		instrumentation.enable()
+		grid.encode(s)
+		print(instrumentation.export())
+
+	functions:
+		enable() : start recording stages
+		disable() : stop recording stages
+		is_enabled() : whether stages are recorded
+		stage() : context manager recording one stage
+		add_hook() : call a function after every recorded stage
+		remove_hook() : stop calling a hook
+		counters() : aggregated counters
+		reset() : clear the counters
+		export() : counters in the Prometheus text format
+'''
+
+# counter names and their descriptions, in the order they are stored
+COUNTERS = (
+	('calls', 'times the stage ran'),
+	('seconds', 'wall time spent in the stage'),
+	('parts', 'parts produced or transformed by the stage'),
+	('input_size', 'characters or bytes into the stage'),
+	('output_size', 'characters or bytes out of the stage')
+)
+METRIC_PREFIX = 'cipher_stage_'
+
+enabled = False
+hooks = []
+# {(cipher, stage) : list of counters}
+stage_counters = {}
+counters_lock = Lock()
+
+class Stage():
+	"""
+		properties
+			cipher : string
+				class name of the cipher
+			name : string
+			parts : int
+			input_size : int
+			output_size : int
+			start : float
+	"""
+	cipher = None
+	name = None
+	parts = 0
+	input_size = 0
+	output_size = 0
+	start = None
+
+	def __init__(self, cipher, name, data = None):
+		self.cipher = cipher
+		self.name = name
+		self.input_size = size(data)
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc_info):
+		seconds = time.perf_counter() - self.start
+		record(
+			self.cipher, self.name,
+			(1, seconds, self.parts, self.input_size, self.output_size)
+		)
+		return False
+
+	def output(self, data, parts = None):
+		"""
+			arguments
+				data : string, bytes or list of strings
+					output of the stage
+				parts : int
+					number of parts, the length of data if None
+		"""
+		self.output_size = size(data)
+		if parts is None and isinstance(data, list):
+			parts = len(data)
+		self.parts = parts or 0
+
+class NullStage():
+	# stands in for Stage while instrumentation is disabled
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		return False
+
+	def output(self, data, parts = None):
+		pass
+
+NULL_STAGE = NullStage()
+
+def enable():
+	global enabled
+	enabled = True
+
+def disable():
+	global enabled
+	enabled = False
+
+def is_enabled():
+	return enabled
+
+def stage(cipher, name, data = None):
+	"""
+		arguments
+			cipher : object or string
+				the cipher running the stage, or its name
+			name : string
+			data : string, bytes or list of strings
+				input of the stage
+		return
+			Stage
+			NullStage
+				if instrumentation is disabled
+	"""
+	res = NULL_STAGE
+	if enabled:
+		if not isinstance(cipher, str):
+			cipher = type(cipher).__name__
+		res = Stage(cipher, name, data)
+	return res
+
+def add_hook(f):
+	"""
+		arguments
+			f : function
+				called with the cipher, the stage name
+				and a dict of counters after every stage
+	"""
+	hooks.append(f)
+
+def remove_hook(f):
+	if f in hooks:
+		hooks.remove(f)
+
+def record(cipher, name, values):
+	with counters_lock:
+		c = stage_counters.setdefault((cipher, name), [0] * len(COUNTERS))
+		for i, v in enumerate(values):
+			c[i] += v
+	for f in list(hooks):
+		f(cipher, name, dict(zip([k for k, _ in COUNTERS], values)))
+
+def size(data):
+	res = 0
+	if isinstance(data, (str, bytes, bytearray)):
+		res = len(data)
+	elif isinstance(data, list):
+		res = sum(map(len, filter(None, data)))
+	return res
+
+def counters():
+	"""
+		return
+			dict {cipher : {stage : {counter : value}}}
+	"""
+	res = {}
+	names = [k for k, _ in COUNTERS]
+	with counters_lock:
+		for (cipher, name), values in stage_counters.items():
+			res.setdefault(cipher, {})[name] = dict(zip(names, values))
+	return res
+
+def reset():
+	with counters_lock:
+		stage_counters.clear()
+
+def export():
+	"""
+		return
+			string
+				counters in the Prometheus text exposition format,
+				one metric per counter labelled by cipher and stage
+	"""
+	res = []
+	with counters_lock:
+		items = sorted(stage_counters.items())
+	for i, (counter, description) in enumerate(COUNTERS):
+		metric = '{}{}_total'.format(METRIC_PREFIX, counter)
+		res.append('# HELP {} {}'.format(metric, description))
+		res.append('# TYPE {} counter'.format(metric))
+		for (cipher, name), values in items:
+			res.append('{}{{cipher="{}",stage="{}"}} {}'.format(
+				metric, escape_label(cipher), escape_label(name), values[i]
+			))
+	return '\n'.join(res) + '\n'
+
+def escape_label(s):
+	return s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
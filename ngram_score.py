@@ -0,0 +1,300 @@
+from string import ascii_lowercase
+import heapq
+import math
+
+import numpy as np
+
+import string_processing
+
+'''
+	n-gram fitness scoring
+
+	NgramScorer class
+
+	log probabilities of the n-grams of a language in a dense array
+	indexed by base 26 letter codes, scoring a text in one sliding
+	window lookup, and a batch of texts in one lookup for the batch
+
+	usage:
+		scorer = NgramScorer.load('english_quadgrams.txt')
+		scorer.score(PlayfairGrid(key).decode(ciphertext))
+		best = rank(ciphertext, keys, hill_cipher_decode, scorer)
+
+	functions:
+		english_letters() : scorer of English letter frequencies
+		letter_codes() : base 26 code of each letter in a text
+		ngram_codes() : code of each n-gram in an array of letter codes
+		rank() : decode a ciphertext with many keys and
+			keep the best scoring keys
+'''
+
+ALPHABET_SIZE = len(ascii_lowercase)
+# counts given to the n-grams never seen
+FLOOR_COUNT = 0.01
+# decoded plaintexts scored together by rank()
+RANK_BATCH_SIZE = 1024
+# relative frequencies of English letters, in percent
+ENGLISH_LETTER_FREQUENCIES = {
+	'a': 8.167, 'b': 1.492, 'c': 2.782, 'd': 4.253, 'e': 12.702,
+	'f': 2.228, 'g': 2.015, 'h': 6.094, 'i': 6.966, 'j': 0.153,
+	'k': 0.772, 'l': 4.025, 'm': 2.406, 'n': 6.749, 'o': 7.507,
+	'p': 1.929, 'q': 0.095, 'r': 5.987, 's': 6.327, 't': 9.056,
+	'u': 2.758, 'v': 0.978, 'w': 2.360, 'x': 0.150, 'y': 1.974,
+	'z': 0.074
+}
+# uppercase ASCII letters to lowercase
+LOWERCASE_BYTES = bytes.maketrans(
+	ascii_lowercase.upper().encode('ascii'),
+	ascii_lowercase.encode('ascii')
+)
+
+class NgramScorer():
+	"""
+		properties
+			n : int
+				length of the n-grams
+			table : numpy array
+				log10 probability of every n-gram by its base 26 code,
+				the floor for the n-grams never seen
+			floor : float
+	"""
+	n = None
+	table = None
+	floor = None
+
+	def __init__(self, table, n):
+		"""
+			arguments
+				table : numpy array
+					ALPHABET_SIZE ** n log probabilities
+				n : int
+		"""
+		self.n = n
+		self.table = table
+		self.floor = float(table.min()) if table.size else None
+
+	@classmethod
+	def from_counts(cls, counts):
+		"""
+			arguments
+				counts : dict {n-gram : count}
+					n-grams of letters, all of the same length
+			return
+				NgramScorer
+		"""
+		lengths = {len(k) for k in counts}
+		if len(lengths) != 1:
+			raise ValueError('n-grams must all have the same length')
+		n = lengths.pop()
+		keys = ''.join(counts)
+		if not (keys.isascii() and keys.isalpha()):
+			raise ValueError('n-grams must only contain letters')
+		total = float(sum(counts.values()))
+		table = np.full(
+			ALPHABET_SIZE ** n, math.log10(FLOOR_COUNT / total),
+			dtype = np.float32
+		)
+		codes = ngram_codes(letter_codes(keys), n)[::n]
+		values = np.array(list(counts.values()), dtype = np.float64)
+		table[codes] = np.log10(values / total)
+		return cls(table, n)
+
+	@classmethod
+	def from_text(cls, text, n):
+		"""
+			n-gram counts of a corpus
+
+			arguments
+				text : string
+					letters of other cases and characters
+					are ignored
+				n : int
+			return
+				NgramScorer
+		"""
+		codes = ngram_codes(letter_codes(text), n)
+		counts = np.bincount(codes, minlength = ALPHABET_SIZE ** n)
+		total = float(max(counts.sum(), 1))
+		counts = np.where(counts > 0, counts, FLOOR_COUNT)
+		table = np.log10(counts / total).astype(np.float32)
+		return cls(table, n)
+
+	@classmethod
+	def load(cls, path):
+		"""
+			arguments
+				path : string
+					text file with an n-gram and its count
+					on each line, as in 'TION 13168375'
+			return
+				NgramScorer
+		"""
+		counts = {}
+		with open(path) as f:
+			for line in f:
+				fields = line.split()
+				if len(fields) == 2:
+					counts[fields[0]] = counts.get(fields[0], 0) + int(fields[1])
+		return cls.from_counts(counts)
+
+	def score(self, text):
+		"""
+			arguments
+				text : string
+			return
+				float
+					sum of the log probabilities of every n-gram
+					of the letters in the text
+		"""
+		return self.score_codes(letter_codes(text))
+
+	def score_codes(self, codes):
+		"""
+			arguments
+				codes : numpy array of int
+					letter codes, one text per row if 2D
+			return
+				float
+				numpy array of float
+					for 2D codes, one score per row
+		"""
+		windows = ngram_codes(codes, self.n)
+		return self.table[windows].sum(axis = -1, dtype = np.float64)
+
+	def score_batch(self, texts):
+		"""
+			arguments
+				texts : list of strings
+			return
+				numpy array of float
+					one score per text, n-grams never
+					span two texts
+		"""
+		codes = [letter_codes(t) for t in texts]
+		lengths = np.array([len(c) for c in codes], dtype = np.intp)
+		res = np.zeros(len(codes), dtype = np.float64)
+		if len(codes) and len(set(lengths.tolist())) == 1:
+			if lengths[0] >= self.n:
+				res = self.score_codes(np.stack(codes))
+		elif len(codes):
+			# one pass over the concatenated texts, dropping
+			# the windows that cross from one text to the next
+			ends = np.cumsum(lengths)
+			windows = ngram_codes(np.concatenate(codes), self.n)
+			starts = np.arange(len(windows))
+			text = np.searchsorted(ends, starts, side = 'right')
+			valid = starts + self.n <= ends[text]
+			res = np.bincount(
+				text[valid], weights = self.table[windows[valid]],
+				minlength = len(codes)
+			).astype(np.float64)
+		return res
+
+	def score_per_ngram(self, text):
+		"""
+			arguments
+				text : string
+			return
+				float
+					average log probability per n-gram, comparable
+					between texts of different lengths
+				None
+					if the text is shorter than an n-gram
+		"""
+		res = None
+		codes = letter_codes(text)
+		if len(codes) >= self.n:
+			res = self.score_codes(codes) / (len(codes) - self.n + 1)
+		return res
+
+def english_letters():
+	"""
+		return
+			NgramScorer
+				monograms of English letter frequencies
+	"""
+	return NgramScorer.from_counts(ENGLISH_LETTER_FREQUENCIES)
+
+def letter_codes(text):
+	"""
+		arguments
+			text : string
+		return
+			numpy array of uint8
+				0 to 25 for every ASCII letter,
+				other characters dropped
+	"""
+	b = string_processing.alpha(text)
+	if isinstance(b, str):
+		b = b.encode('ascii', 'ignore')
+	b = b.translate(LOWERCASE_BYTES)
+	return np.frombuffer(b, np.uint8) - ord('a')
+
+def ngram_codes(codes, n):
+	"""
+		arguments
+			codes : numpy array of int
+				letter codes, one text per row if 2D
+			n : int
+		return
+			numpy array of int
+				base 26 code of the n-gram starting at each
+				position, first letter most significant
+	"""
+	codes = np.asarray(codes)
+	l = codes.shape[-1] - n + 1
+	res = np.zeros(codes.shape[:-1] + (max(l, 0),), dtype = np.intp)
+	if l > 0:
+		for i in range(n):
+			res *= ALPHABET_SIZE
+			res += codes[..., i:i + l]
+	return res
+
+def rank(ciphertext, keys, decode, scorer, top = 10):
+	"""
+		decode a ciphertext with every key and score the plaintexts
+		in batches
+
+		arguments
+			ciphertext : string
+			keys : iterable
+			decode : function
+				called with the ciphertext and a key, returning
+				the plaintext as CipherGrid.decode does, or
+				a (plaintext, key) tuple as hill_cipher_decode does,
+				keys it raises TypeError or ValueError for are skipped
+			scorer : NgramScorer
+			top : int
+				number of keys kept
+		return
+			list of tuples
+				(score, key, plaintext), best first
+	"""
+	res = []
+	batch = []
+	for i, key in enumerate(keys):
+		try:
+			plaintext = decode(ciphertext, key)
+		except (TypeError, ValueError):
+			plaintext = None
+		if isinstance(plaintext, tuple):
+			plaintext = plaintext[0]
+		if plaintext:
+			batch.append((i, key, plaintext))
+		if len(batch) == RANK_BATCH_SIZE:
+			keep_best(res, batch, scorer, top)
+			batch = []
+	keep_best(res, batch, scorer, top)
+	res.sort(key = lambda item: item[:2], reverse = True)
+	return [(s, key, p) for s, _, key, p in res]
+
+def keep_best(heap, batch, scorer, top):
+	# heap of the top (score, -index, key, plaintext), worst first
+	if batch:
+		scores = scorer.score_batch([p for _, _, p in batch])
+		for (i, key, plaintext), score in zip(batch, scores.tolist()):
+			item = (score, -i, key, plaintext)
+			if len(heap) < top:
+				heapq.heappush(heap, item)
+			elif item[:2] > heap[0][:2]:
+				heapq.heapreplace(heap, item)
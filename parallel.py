@@ -0,0 +1,97 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import os
+
+'''
+	parallel processing
+
+	functions:
+		worker_count() : number of worker processes to use
+		chunks() : split an iterable into lists of adaptive size
+		imap_ordered() : map a function over chunks of items
+			in a process pool, streaming results back in order
+'''
+
+# bounds of the adaptive chunk size
+MIN_CHUNK_SIZE = 16
+MAX_CHUNK_SIZE = 4096
+# chunks per worker when the number of items is known
+CHUNKS_PER_WORKER = 4
+
+def worker_count(workers = None):
+	"""
+		arguments
+			workers : int
+				None for one worker per CPU
+		return
+			int
+	"""
+	return workers or os.cpu_count() or 1
+
+def chunks(items, chunk_size = None, workers = 1):
+	"""
+		split an iterable into lists
+
+		with no chunk size, sized iterables are split into
+		CHUNKS_PER_WORKER chunks per worker, and other iterables
+		into chunks that double from MIN_CHUNK_SIZE
+		up to MAX_CHUNK_SIZE
+
+		arguments
+			items : iterable
+			chunk_size : int
+			workers : int
+		return
+			generator of lists
+	"""
+	size = chunk_size
+	if size is None and hasattr(items, '__len__'):
+		size = -(-len(items) // (workers * CHUNKS_PER_WORKER))
+		size = min(max(size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+	grow = size is None
+	if grow:
+		size = MIN_CHUNK_SIZE
+	it = iter(items)
+	chunk = list(islice(it, size))
+	while chunk:
+		yield chunk
+		if grow:
+			size = min(size * 2, MAX_CHUNK_SIZE)
+		chunk = list(islice(it, size))
+
+def imap_ordered(f, items, initializer = None, initargs = (),
+		workers = None, chunk_size = None):
+	"""
+		f applied to chunks of items in a process pool
+
+		the pool state is set up once per worker by initializer,
+		at most two chunks per worker are in flight at a time,
+		and results are yielded in the order of the items
+
+		arguments
+			f : function
+				picklable, takes a list of items
+				and returns a list of results
+			items : iterable
+			initializer : function
+			initargs : tuple
+			workers : int
+			chunk_size : int
+		return
+			generator
+	"""
+	workers = worker_count(workers)
+	pool = ProcessPoolExecutor(
+		workers, initializer = initializer, initargs = initargs
+	)
+	pending = deque()
+	try:
+		for chunk in chunks(items, chunk_size, workers):
+			pending.append(pool.submit(f, chunk))
+			if len(pending) >= 2 * workers:
+				yield from pending.popleft().result()
+		while pending:
+			yield from pending.popleft().result()
+	finally:
+		pool.shutdown(cancel_futures = True)
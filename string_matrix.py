@@ -1,3 +1,5 @@
+import numpy as np
+
 import string_processing
 
 '''
@@ -8,8 +10,11 @@ import string_processing
 	functions:
 		locate() : find character in the matrix given coordinates
 		coordinates() : get matrix coordinates for the given character
+		index_matrix() : build the character and position lookup tables
+		reset_index() : drop the lookup tables
 		transpose_columns() : switch columns of the matrix
 		transpose() : matrix transposition
+		swap() : swap the characters at two positions
 		__str()__() : format the class variable matrix for printing
 '''
 
@@ -24,11 +29,19 @@ class StringMatrix():
 				base index of coordinates in the matrix
 			matrix : list of lists
 				two-dimensional list of characters
+			char_index : dict
+				{character : list of coordinates}
+				built on demand, dropped when the matrix changes
+			position_index : dict
+				{coordinates : character}
+				built on demand, dropped when the matrix changes
 	"""
 	s = None
 	dimensions = None
 	base_index = None
 	matrix = None
+	char_index = None
+	position_index = None
 
 	def __init__(self, s, dimensions, 
 				base_index = 0, padding = None):
@@ -49,6 +62,7 @@ class StringMatrix():
 			self.s = None
 		else:
 			self.s = matrix_to_string(self.matrix)
+		self.reset_index()
 
 	def locate(self, p):
 		"""
@@ -62,15 +76,10 @@ class StringMatrix():
 					if the matrix coordinates represented by p 
 						are out of range
 		"""
-		res = None
-		b = self.base_index
-		rows, columns = self.dimensions
 		r, c = p
-		r -= b 
-		c -= b
-		if 0 <= r < rows and 0 <= c < columns:
-			res = self.s[r * columns + c]
-		return res
+		if self.position_index is None:
+			self.index_matrix()
+		return self.position_index.get((r, c))
 
 	def coordinates(self, c):
 		"""
@@ -85,18 +94,33 @@ class StringMatrix():
 					if c is an empty string	
 					if c has more than one character		
 		"""
-		res = []
-		n_columns = self.dimensions[1]
-		if c and len(c) == 1:
-			index_list = string_processing.find_char(self.s, c)
-			if index_list:
-				for i in index_list:
-					base_index = self.base_index
-					row_index, col_index = divmod(i, n_columns)
-					res.append(
-						(row_index + base_index, col_index + base_index)
-					)
-		return res
+		if self.char_index is None:
+			self.index_matrix()
+		return list(self.char_index.get(c, ()))
+
+	def index_matrix(self):
+		"""
+			build the character and position lookup tables 
+				used by coordinates() and locate()
+		"""
+		char_index = {}
+		position_index = {}
+		if self.matrix:
+			b = self.base_index
+			for r, row in enumerate(self.matrix, b):
+				for col, c in enumerate(row, b):
+					p = (r, col)
+					position_index[p] = c
+					char_index.setdefault(c, []).append(p)
+		self.char_index = char_index
+		self.position_index = position_index
+
+	def reset_index(self):
+		"""
+			drop the lookup tables after the matrix has changed
+		"""
+		self.char_index = None
+		self.position_index = None
 
 	def transpose_columns(self, o):
 		"""
@@ -121,6 +145,7 @@ class StringMatrix():
 		if m:
 			self.matrix = m
 			self.s = matrix_to_string(m)
+			self.reset_index()
 			res = True
 		return res
 
@@ -139,9 +164,47 @@ class StringMatrix():
 		if m:
 			self.matrix = m
 			self.s = matrix_to_string(m)
+			self.reset_index()
 			res = True
 		return res
 
+	def swap(self, p1, p2):
+		"""
+			swap the characters at two positions, updating
+				the string and the lookup tables in place
+
+			arguments
+				p1, p2 : tuple of int
+			return
+				True
+					if both positions are in the matrix
+				False
+					otherwise
+		"""
+		res = False
+		if self.position_index is None:
+			self.index_matrix()
+		a = self.position_index.get(p1)
+		b = self.position_index.get(p2)
+		if a is not None and b is not None:
+			if a != b:
+				self.__set(p1, b)
+				self.__set(p2, a)
+				index_a = self.char_index[a]
+				index_a[index_a.index(p1)] = p2
+				index_b = self.char_index[b]
+				index_b[index_b.index(p2)] = p1
+			res = True
+		return res
+
+	def __set(self, p, c):
+		base = self.base_index
+		r, col = p[0] - base, p[1] - base
+		i = r * len(self.matrix[0]) + col
+		self.matrix[r][col] = c
+		self.s = self.s[:i] + c + self.s[i + 1:]
+		self.position_index[p] = c
+
 	def __str__(self):
 		"""
 			string representation of the matrix
@@ -156,6 +219,185 @@ class StringMatrix():
 		else:
 			return str(None)
 
+'''
+	ArrayStringMatrix class
+
+	characters stored as codepoints in a single two-dimensional 
+	numpy array, a drop-in replacement for StringMatrix 
+	for large matrices
+
+	transpose() returns a view of the same array, 
+	transpose_columns() is a single gather, 
+	s and matrix are built when they are first read
+'''
+
+class ArrayStringMatrix(StringMatrix):
+	"""
+		properties
+			array : numpy array
+				two-dimensional array of codepoints,
+				uint8 if every character is ASCII, uint32 otherwise
+			s : string
+				the string stored in the matrix, built on demand
+			matrix : list of lists
+				two-dimensional list of characters, built on demand
+	"""
+	array = None
+	__s = None
+	__matrix = None
+
+	def __init__(self, s, dimensions, 
+				base_index = 0, padding = None):
+		"""
+			arguments
+				s : string
+				dimensions : tuple of int 
+					(r, c) for an r-by-c matrix 
+				base_index : int
+				padding : string
+		"""
+		self.base_index = base_index
+		self.array = string_array(s, dimensions, padding = padding)
+		if self.array is not None and self.array.size:
+			self.dimensions = dimensions
+		self.reset_index()
+
+	@property
+	def s(self):
+		if self.__s is None and self.array is not None:
+			self.__s = array_to_string(self.array)
+		return self.__s
+
+	@property
+	def matrix(self):
+		if self.__matrix is None and self.array is not None:
+			columns = self.array.shape[1]
+			self.__matrix = list(
+				map(list, string_processing.split_n(self.s, columns))
+			)
+		return self.__matrix
+
+	def locate(self, p):
+		"""
+			value of the character at the specified position
+
+			arguments
+				p : tuple of int
+			return
+				string
+				None
+					if the matrix coordinates represented by p 
+						are out of range
+		"""
+		res = None
+		b = self.base_index
+		rows, columns = self.array.shape
+		r, c = p
+		r -= b 
+		c -= b
+		if 0 <= r < rows and 0 <= c < columns:
+			res = chr(self.array[r, c])
+		return res
+
+	def index_matrix(self):
+		"""
+			build the character and position lookup tables 
+				used by coordinates() and locate()
+		"""
+		char_index = {}
+		position_index = {}
+		if self.array is not None and self.array.size:
+			b = self.base_index
+			columns = self.array.shape[1]
+			for i, c in enumerate(self.s):
+				r, col = divmod(i, columns)
+				p = (r + b, col + b)
+				position_index[p] = c
+				char_index.setdefault(c, []).append(p)
+		self.char_index = char_index
+		self.position_index = position_index
+
+	def reset_index(self):
+		"""
+			drop the lookup tables and the cached string 
+			after the matrix has changed
+		"""
+		super().reset_index()
+		self.__s = None
+		self.__matrix = None
+
+	def transpose_columns(self, o):
+		"""
+			transpose columns of the matrix 
+				to the order specified 
+	
+			arguments
+				o : list
+					where o[i] is the index of the column 
+					that should be at the ith position 
+					in the result
+					all i should be unique and within 
+						the number of columns of m
+			return
+				True
+					if the matrix is set to a new value
+				False
+					otherwise
+		"""
+		res = False
+		if self.array is not None and self.array.size:
+			n_columns = self.array.shape[1]
+			unique_columns = set(o)
+			if len(unique_columns) == len(o) == n_columns:
+				if all(0 <= i < n_columns for i in unique_columns):
+					self.array = self.array[:, list(o)]
+					self.reset_index()
+					res = True
+		return res
+
+	def transpose(self):
+		"""
+			transpose of the matrix, a view of the same array
+
+			return
+				True
+					if the matrix is set to a new value
+				False
+					otherwise
+		"""
+		res = False
+		if self.array is not None and self.array.size:
+			self.array = self.array.T
+			self.reset_index()
+			res = True
+		return res
+
+	def swap(self, p1, p2):
+		"""
+			swap the characters at two positions of the array
+
+			arguments
+				p1, p2 : tuple of int
+			return
+				True
+					if both positions are in the matrix
+				False
+					otherwise
+		"""
+		res = False
+		if self.array is not None:
+			base = self.base_index
+			rows, columns = self.array.shape
+			i = (p1[0] - base, p1[1] - base)
+			j = (p2[0] - base, p2[1] - base)
+			if all(0 <= r < rows and 0 <= c < columns for r, c in (i, j)):
+				if not self.array.flags.writeable:
+					self.array = self.array.copy()
+				self.array[i], self.array[j] = self.array[j], self.array[i]
+				self.reset_index()
+				res = True
+		return res
+
 '''
 	module level functions
 '''
@@ -221,6 +463,73 @@ def string_matrix(s, dimensions, padding = None):
 			res = []
 	return res
 
+def string_array(s, dimensions, padding = None):
+	"""
+		two-dimensional array of the codepoints of a string, 
+		filled by row, with the same dimensions, padding 
+		and trimming as string_matrix()
+
+		arguments
+			s : string
+			dimensions : tuple of int 
+				(r, c) for an r-by-c matrix 
+			padding : string
+		return
+			numpy array
+			empty array
+				if both dimensions are zero
+				if s is empty
+			None
+				if neither dimension is a positive number
+				if dimensions multiply to a value greater 
+					than the length of the string 
+					and no padding is specified
+	"""
+	res = None
+	try:
+		r, c = dimensions
+	except:
+		pass
+	else:
+		if (r == 0 and c == 0) or not s:
+			res = ''
+		else:
+			l = len(s)
+			if c > 0:
+				if r <= 0:
+					r = -(-l // c) if padding else l // c
+			elif r > 0:
+				c = -(-l // r)
+				if not padding and r * c != l:
+					c = 0
+			if r > 0 and c > 0:
+				res = string_processing.pad_to_length(
+					s, r * c, padding = padding
+				) or None
+		if res is not None:
+			if res.isascii():
+				a = np.frombuffer(res.encode('ascii'), np.uint8)
+			else:
+				a = np.frombuffer(res.encode('utf-32-le'), np.uint32)
+			res = a.reshape(r, c) if res else a.reshape(0, 0)
+	return res
+
+def array_to_string(a):
+	"""
+		array of codepoints flattened to string by row
+
+		arguments
+			a : numpy array
+		return
+			string
+	"""
+	a = np.ascontiguousarray(a)
+	if a.dtype == np.uint8:
+		res = a.tobytes().decode('ascii')
+	else:
+		res = a.astype(np.uint32).tobytes().decode('utf-32-le')
+	return res
+
 def matrix_to_string(m):
 	"""
 		list of items 
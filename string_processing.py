@@ -1,8 +1,72 @@
+from functools import lru_cache
+from string import ascii_letters, digits as ascii_digits
+from types import MappingProxyType
+import codecs
 import re
 
 '''
 	string processing
 '''
+
+'''
+	precompiled patterns and deletion tables
+'''
+# character classes of the grouping functions
+GROUP_CLASSES = {
+	'any': r'.',
+	'printable': r'[ -~]',
+	'alpha': r'[a-zA-Z]',
+	'digits': r'[\d]',
+	'alnum': r'[a-zA-Z0-9]'
+}
+
+# members of the character classes, for scanning runs by hand
+GROUP_CHARS = {
+	'printable': ''.join(map(chr, range(32, 127))),
+	'alpha': ascii_letters,
+	'digits': ascii_digits,
+	'alnum': ascii_letters + ascii_digits
+}
+
+NON_ALPHA_PATTERN = re.compile(r'[^a-zA-Z]+')
+NON_DIGITS_PATTERN = re.compile(r'\D+')
+NON_ALNUM_PATTERN = re.compile(r'[^a-zA-Z0-9]+')
+DOUBLE_LETTERS_PATTERN = re.compile(r'([a-zA-Z])[^a-zA-Z]*\1')
+# strings replace() loops over rather than looking up their Translator
+SHORT_REPLACE_LENGTH = 40
+
+def deletion_table(keep):
+	"""
+		all byte values except the given characters,
+		for bytes.translate()
+
+		arguments
+			keep : string
+		return
+			bytes
+	"""
+	keep = set(keep.encode('ascii'))
+	return bytes(i for i in range(256) if i not in keep)
+
+NON_ALPHA_BYTES = deletion_table(ascii_letters)
+NON_DIGITS_BYTES = deletion_table(ascii_digits)
+NON_ALNUM_BYTES = deletion_table(ascii_letters + ascii_digits)
+
+@lru_cache(maxsize = 64)
+def group_pattern(chars, n):
+	"""
+		compiled pattern for nonoverlapping groups of n contiguous 
+		characters of a class in GROUP_CLASSES
+
+		arguments
+			chars : string
+				'any', 'printable', 'alpha', 'digits' or 'alnum'
+			n : int
+		return
+			compiled regular expression
+	"""
+	return re.compile(GROUP_CLASSES[chars] + r'{' + str(n) + r'}')
+
 def unique(s):
 	"""
 		unique characters in a string
@@ -24,11 +88,168 @@ def rotate(s, n):
 	"""
 	return s[-n:] + s[:-n]
 
+class Translator():
+	"""
+		a compiled, immutable replacement of characters 
+		or substrings, reusable across calls and threads
+
+		single-character keys are translated with str.translate() 
+		and bytes.translate(), longer keys with a regular expression 
+		alternation that prefers the longest key
+
+		properties
+			mapping : mapping
+				{key : replacement}, 
+				including the removed keys mapped to ''
+			default : string
+				replacement of every character that is not a key,
+				None to keep them
+	"""
+	mapping = MappingProxyType({})
+	default = None
+	__table = None
+	__pattern = None
+	__bytes_table = None
+	__bytes_delete = None
+	__bytes_pattern = None
+	# ASCII strings translated as bytes
+	__ascii = False
+
+	def __init__(self, mapping = None, default = None, remove = ()):
+		"""
+			arguments
+				mapping : dict
+					{key : replacement}
+				default : None or string
+				remove : string or iterable of strings
+					keys replaced with '', 
+					each character of a string is a key
+		"""
+		m = dict(mapping or {})
+		m.update({k: '' for k in remove})
+		self.mapping = MappingProxyType(m)
+		self.default = default or None
+		if all(len(k) == 1 for k in m):
+			# None deletes without leaving the ASCII fast path
+			table = str.maketrans({k: v or None for k, v in m.items()})
+			if self.default is None:
+				self.__table = table
+			else:
+				self.__table = DefaultTable(table, self.default)
+		else:
+			self.__pattern = alternation(m, self.default)
+		self.__compile_bytes()
+
+	def __compile_bytes(self):
+		try:
+			m = {
+				k.encode('latin-1'): v.encode('latin-1') 
+				for k, v in self.mapping.items()
+			}
+			default = (self.default or '').encode('latin-1') or None
+		except (AttributeError, UnicodeEncodeError):
+			return
+		if default is None and all(
+			len(k) == 1 and len(v) <= 1 for k, v in m.items()
+		):
+			source = b''.join(k for k, v in m.items() if v)
+			target = b''.join(v for k, v in m.items() if v)
+			self.__bytes_table = bytes.maketrans(source, target)
+			self.__bytes_delete = b''.join(k for k, v in m.items() if not v)
+			self.__ascii = all(v.isascii() for v in m.values())
+		else:
+			self.__bytes_pattern = alternation(m, default)
+
+	def __reduce__(self):
+		# removed keys are already in the mapping
+		return (Translator, (dict(self.mapping), self.default))
+
+	def __call__(self, s):
+		return self.translate(s)
+
+	def translate(self, s):
+		"""
+			arguments
+				s : string or bytes
+			return
+				string or bytes
+			raises
+				ValueError
+					if s is bytes and the keys or replacements 
+					are not single-byte characters
+		"""
+		if isinstance(s, str):
+			if self.__ascii and s.isascii():
+				res = s.encode('ascii').translate(
+					self.__bytes_table, self.__bytes_delete
+				).decode('ascii')
+			elif self.__table is not None:
+				res = s.translate(self.__table)
+			else:
+				res = self.__pattern.sub(self.__pattern_replacement, s)
+		else:
+			if self.__bytes_table is not None:
+				res = s.translate(self.__bytes_table, self.__bytes_delete)
+			elif self.__bytes_pattern is not None:
+				res = self.__bytes_pattern.sub(
+					self.__bytes_replacement, s
+				)
+			else:
+				raise ValueError('mapping cannot be applied to bytes')
+		return res
+
+	def __pattern_replacement(self, match):
+		return self.mapping.get(match.group(), self.default)
+
+	def __bytes_replacement(self, match):
+		k = match.group().decode('latin-1')
+		res = self.mapping.get(k, self.default)
+		return res.encode('latin-1')
+
+class DefaultTable(dict):
+	"""
+		str.translate() table that replaces every character 
+		missing from the table with a default
+	"""
+	default = None
+
+	def __init__(self, table, default):
+		super().__init__(table)
+		self.default = default
+
+	def __missing__(self, key):
+		return self.default
+
+def alternation(mapping, default = None):
+	"""
+		compiled regular expression matching any key of a mapping,
+		longest keys first, or any other character if there is 
+		a default
+
+		arguments
+			mapping : dict
+				string or bytes keys
+			default : None, string or bytes
+		return
+			compiled regular expression
+	"""
+	keys = sorted(mapping, key = len, reverse = True)
+	if any(isinstance(k, bytes) for k in keys) or isinstance(default, bytes):
+		bar, dot, never = b'|', b'(?s:.)', b'(?!)'
+	else:
+		bar, dot, never = '|', '(?s:.)', '(?!)'
+	alternatives = [re.escape(k) for k in keys]
+	if default is not None:
+		alternatives.append(dot)
+	return re.compile(bar.join(alternatives) or never)
+
 def replace(s, mapping, default = None, join = None):
 	""" 
 		arguments
 			s : string or list of strings
-			mapping : dict  
+			mapping : dict or Translator
+				a Translator skips the lookup of 
+				the compiled mapping
 			default : None or string
 			join : None or string
 				if not None, replacements will be joined 
@@ -36,21 +257,51 @@ def replace(s, mapping, default = None, join = None):
 		return 
 			string
 	"""
-	s2 = []
-	for c in s:
-		if c in mapping:
-			s2.append(mapping[c])
-		else:
-			if not default:
-				s2.append(c)
-			else:
-				s2.append(default)
-	if join:
-		res = join.join(s2)
+	translator = None
+	if isinstance(mapping, Translator):
+		translator = mapping
+		mapping = translator.mapping
+		if default is None:
+			default = translator.default
+	elif isinstance(s, str) and not join and len(s) >= SHORT_REPLACE_LENGTH:
+		translator = replacement(mapping, default)
+	if translator is not None and isinstance(s, str) and not join:
+		res = translator.translate(s)
 	else:
-		res = ''.join(s2)   
+		s2 = []
+		for c in s:
+			if c in mapping:
+				s2.append(mapping[c])
+			else:
+				if not default:
+					s2.append(c)
+				else:
+					s2.append(default)
+		if join:
+			res = join.join(s2)
+		else:
+			res = ''.join(s2)   
+	return res
+
+def replacement(mapping, default):
+	# Translator of replace(), shared between calls with the same mapping
+	try:
+		res = cached_replacement(
+			tuple(mapping), tuple(mapping.values()), default
+		)
+	except TypeError:
+		# unhashable replacements are compiled on every call
+		res = cached_replacement.__wrapped__(
+			mapping, mapping.values(), default
+		)
 	return res
 
+@lru_cache(maxsize = 64)
+def cached_replacement(keys, values, default):
+	# only single characters of a string can match a key
+	mapping = {k: v for k, v in zip(keys, values) if len(k) == 1}
+	return Translator(mapping, default)
+
 def replace_and_remove(s, mapping):
 	"""
 		arguments
@@ -59,26 +310,31 @@ def replace_and_remove(s, mapping):
 		return
 			string
 
-		replace all k in the string with v for (k, v) and remove v
+		replace all k in the string with v for (k, v) and remove v,
+		the mapping is not modified
 	"""
-	replace_compliment = {v : '' for v in mapping.values() if v}
-	mapping.update(replace_compliment)
+	mapping = dict(mapping)
+	mapping.update({v : '' for v in mapping.values() if v})
 	return replace(s, mapping)
 
 def remove(s, chars):
 	"""
 		arguments
-			s : string or list
+			s : string or bytes
 			chars : string or list
 		return 
-			string
+			string or bytes
 	"""
 	res = s
 	if chars:
-		pattern = re.compile(r'[' + ''.join(chars) + r']')
-		res = pattern.sub('', s)
+		res = removal(''.join(chars)).translate(s)
 	return res
 
+@lru_cache(maxsize = 64)
+def removal(chars):
+	# Translator removing the characters of a string
+	return Translator(remove = chars)
+
 '''
 	searching
 '''
@@ -105,6 +361,41 @@ def find_char(s, c):
 			res = [f.start() for f in fi]
 	return res
 
+'''
+	reading
+'''
+def text_chunks(source, chunk_size = 1 << 20):
+	"""
+		text read from a string, a file object 
+		or an iterable of chunks, one chunk at a time
+
+		bytes are decoded as UTF-8, including characters 
+		split across chunk boundaries
+
+		arguments
+			source : string, bytes, file object or iterable
+			chunk_size : int
+				number of characters or bytes read 
+				from a file object at a time
+		return
+			generator of non-empty strings
+	"""
+	if isinstance(source, (str, bytes, bytearray, memoryview)):
+		chunks = [source]
+	elif hasattr(source, 'read'):
+		chunks = iter(lambda: source.read(chunk_size), source.read(0))
+	else:
+		chunks = source
+	decoder = codecs.getincrementaldecoder('utf-8')()
+	for chunk in chunks:
+		if not isinstance(chunk, str):
+			chunk = decoder.decode(chunk)
+		if chunk:
+			yield chunk
+	tail = decoder.decode(b'', final = True)
+	if tail:
+		yield tail
+
 '''
 	splitting and repeating
 '''
@@ -224,41 +515,60 @@ def repeat_to_length(s, n):
 '''
 	filtering
 '''
+def filter_chars(s, delete, pattern):
+	"""
+		remove characters from a string or bytes, through 
+		bytes.translate() unless the string has non-ASCII characters
+
+		arguments
+			s : string or bytes
+			delete : bytes
+				deletion table of the characters removed
+			pattern : compiled regular expression
+				matching runs of the characters removed
+		return
+			string or bytes
+	"""
+	if isinstance(s, (bytes, bytearray)):
+		res = s.translate(None, delete)
+	elif s.isascii():
+		res = s.encode('ascii').translate(None, delete).decode('ascii')
+	else:
+		res = pattern.sub('', s)
+	return res
+
 def alnum(s):
 	"""
 		only alphanumeric characters in a string
 
 		arguments
-			s : string
+			s : string or bytes
 		return
-			string
+			string or bytes
 	"""
-	pattern = re.compile(r'[a-zA-Z0-9]+')
-	return ''.join(pattern.findall(s))
+	return filter_chars(s, NON_ALNUM_BYTES, NON_ALNUM_PATTERN)
 
 def alpha(s):
 	"""
 		only alphabetic characters in a string
 
 		arguments
-			s : string
+			s : string or bytes
 		return
-			string
+			string or bytes
 	"""
-	pattern = re.compile(r'[a-zA-Z]')
-	return ''.join(pattern.findall(s))
+	return filter_chars(s, NON_ALPHA_BYTES, NON_ALPHA_PATTERN)
 
 def digits(s):
 	"""
 		only digits in a string
 
 		arguments
-			s : string
+			s : string or bytes
 		return
-			string
+			string or bytes
 	"""
-	pattern = re.compile(r'\d')
-	return ''.join(pattern.findall(s))
+	return filter_chars(s, NON_DIGITS_BYTES, NON_DIGITS_PATTERN)
 
 '''
 	grouping
@@ -275,8 +585,7 @@ def group_n(s, n):
 		return
 			list
 	"""
-	pattern = re.compile(r'.{' + str(n) + r'}')
-	return pattern.findall(s)
+	return group_pattern('any', n).findall(s)
 
 def group_printable(s, n):
 	"""
@@ -289,8 +598,7 @@ def group_printable(s, n):
 		return 
 			list
 	"""
-	pattern = re.compile(r'[ -~]{' + str(n) + r'}')
-	return pattern.findall(s)
+	return group_pattern('printable', n).findall(s)
 
 def group_alpha(s, n):
 	"""
@@ -303,8 +611,11 @@ def group_alpha(s, n):
 		return 
 			lists
 	"""
-	pattern = re.compile(r'[a-zA-Z]{' + str(n) + r'}')
-	return pattern.findall(s)
+	if n == 1:
+		res = list(alpha(s))
+	else:
+		res = group_pattern('alpha', n).findall(s)
+	return res
 
 def group_digits(s, n):
 	"""
@@ -317,8 +628,11 @@ def group_digits(s, n):
 		return 
 			list
 	"""
-	pattern = re.compile(r'[\d]{' + str(n) + r'}')
-	return pattern.findall(s)
+	if n == 1:
+		res = list(digits(s))
+	else:
+		res = group_pattern('digits', n).findall(s)
+	return res
 
 def group_alnum(s, n):
 	"""
@@ -331,8 +645,74 @@ def group_alnum(s, n):
 		return 
 			list 
 	"""
-	pattern = re.compile(r'[a-zA-Z0-9]{' + str(n) + '}')
-	return pattern.findall(s)
+	if n == 1:
+		res = list(alnum(s))
+	else:
+		res = group_pattern('alnum', n).findall(s)
+	return res
+
+def iter_groups(s, n, chars = 'any'):
+	"""
+		generator of the groups of group_n(), group_printable(),
+		group_alpha(), group_digits() or group_alnum(), 
+		without building a list
+
+		arguments
+			s : string
+			n : int
+			chars : string
+				'any', 'printable', 'alpha', 'digits' or 'alnum'
+		return
+			generator of string
+	"""
+	return (m.group() for m in group_pattern(chars, n).finditer(s))
+
+def group_spans(s, n, chars = 'any'):
+	"""
+		generator of the (start, end) indices of the groups 
+		of iter_groups(), without copying any characters
+
+		arguments
+			s : string
+			n : int
+			chars : string
+				'any', 'printable', 'alpha', 'digits' or 'alnum'
+		return
+			generator of tuple of int
+	"""
+	return (m.span() for m in group_pattern(chars, n).finditer(s))
+
+def groups_end(s, n, chars = 'alpha', period = 1):
+	"""
+		end of the last whole group of n contiguous characters 
+		of a class in a string, as grouped by iter_groups(), 
+		the characters after it may start a group continued 
+		by the next chunk of a stream
+
+		arguments
+			s : string
+			n : int
+			chars : string
+				'printable', 'alpha', 'digits' or 'alnum'
+			period : int
+				the groups before the end are a multiple of period
+		return
+			int
+	"""
+	members = GROUP_CHARS[chars]
+	# a run reaching the end of s may go on in the next chunk
+	res = len(s) - (len(s) - len(s.rstrip(members))) % n
+	if period > 1:
+		pattern = re.compile(GROUP_CLASSES[chars] + '+')
+		runs = [m.span() for m in pattern.finditer(s, 0, res)]
+		extra = sum((end - start) // n for start, end in runs) % period
+		# the extra groups are dropped from the last runs
+		while extra:
+			start, end = runs.pop()
+			groups = (end - start) // n
+			res = start + max(groups - extra, 0) * n
+			extra -= min(groups, extra)
+	return res
 
 def double_letters_i(s):
 	"""
@@ -346,7 +726,7 @@ def double_letters_i(s):
 			list of tuples
 				index of each letter in the pair
 	"""
-	pattern = re.compile(r'([a-zA-Z])[^a-zA-Z]*\1')
+	pattern = DOUBLE_LETTERS_PATTERN
 	return [(m.start(), m.end() - 1) for m in re.finditer(pattern, s)]
 
 def every_nth(s, n, o = 0):
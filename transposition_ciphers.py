@@ -1,3 +1,9 @@
+from functools import lru_cache
+import os
+
+import numpy as np
+
+import instrumentation
 import string_matrix
 import string_processing
 
@@ -5,13 +11,27 @@ import string_processing
 	Transposition ciphers
 
 	ciphers provided:
+		- Columnar transposition
 		- Scytale
+
+	functions:
+		transposition_plan() : compiled gather index 
+			for a transposition of a given shape
+		transpose_file() : columnar transposition of a file 
+			through memory maps, for inputs larger than memory
 '''
 
+# longest input whose transposition plan is cached
+CACHED_PLAN_LENGTH = 1 << 16
+# plans of shorter inputs gather through int32 positions
+INT32_LIMIT = np.iinfo(np.int32).max
+
 class TranspositionCipher(string_matrix.StringMatrix):
 	padding = 'x'
 	mode = None
 	transposition_key = None
+	plan = None
+	__matrix = None
 
 	def __init__(self, mode, s, dimensions, 
 			transposition_key = None, **kwargs):
@@ -19,9 +39,49 @@ class TranspositionCipher(string_matrix.StringMatrix):
 			self.transposition_key = string_processing.unique(
 				transposition_key
 			)
-		super().__init__(s, dimensions, padding = self.padding)
 		self.mode = mode
-		self.__transform(mode)
+		self.plan = transposition_plan(
+			mode, len(s), dimensions, self.transposition_key
+		)
+		with instrumentation.stage(self, mode, s) as stage:
+			if self.plan is None:
+				super().__init__(s, dimensions, padding = self.padding)
+				self.__transform(mode)
+			else:
+				self.base_index = 0
+				self.s = self.plan.apply(s, self.padding)
+				if self.s:
+					self.dimensions = dimensions
+			stage.output(self.s)
+
+	@classmethod
+	def encode_iter(cls, chunks, *args, **kwargs):
+		return cls.transform_iter('encode', chunks, *args, **kwargs)
+
+	@classmethod
+	def decode_iter(cls, chunks, *args, **kwargs):
+		return cls.transform_iter('decode', chunks, *args, **kwargs)
+
+	@classmethod
+	def transform_iter(cls, mode, chunks, *args, **kwargs):
+		# every character may move anywhere in the message, 
+		# which is buffered until the end of the stream
+		res = cls(mode, ''.join(chunks), *args, **kwargs).get_s()
+		if res:
+			yield res
+
+	@property
+	def matrix(self):
+		# built from the transposed string on first use
+		if self.__matrix is None and self.plan is not None:
+			self.__matrix = string_matrix.string_matrix(
+				self.s, self.plan.dimensions
+			)
+		return self.__matrix
+
+	@matrix.setter
+	def matrix(self, m):
+		self.__matrix = m
 
 	def __transform(self, mode, **kwargs):
 		if self.mode == 'encode':
@@ -42,11 +102,7 @@ class TranspositionCipher(string_matrix.StringMatrix):
 		super().transpose_columns(o)
 
 	def permutation_order(self):
-		l = len(self.transposition_key)
-		res = sorted(range(l), key = lambda i: self.transposition_key[i])
-		if self.mode == 'decode':
-			res = [res.index(i) for i in range(l)]
-		return res
+		return permutation_order(self.transposition_key, self.mode)
 
 	def get_s(self):
 		return self.s
@@ -75,3 +131,284 @@ class ScytaleCipher(TranspositionCipher):
 			res = self.s
 		return res
 
+
+class TranspositionPlan():
+	"""
+		a transposition compiled to a single gather index
+
+		properties
+			index : numpy array of int
+				position in the input of every output character,
+				where the input length stands for padding
+			length : int
+				length of the input
+			dimensions : tuple of int
+				dimensions of the output matrix
+	"""
+	index = None
+	length = None
+	dimensions = None
+
+	def __init__(self, index, length, dimensions):
+		"""
+			arguments
+				index : numpy array of int
+				length : int
+				dimensions : tuple of int
+		"""
+		self.index = index
+		self.length = length
+		self.dimensions = dimensions
+
+	def apply(self, s, padding = 'x'):
+		"""
+			transposition of a sequence
+
+			arguments
+				s : string, bytes or numpy array
+					of the plan's input length
+				padding : string, bytes or number
+					a character pads an integer array 
+					by its code point
+			return
+				string, bytes or numpy array
+					same type as s
+			raises
+				TypeError
+					if a character pads an array of non-integers
+		"""
+		if isinstance(s, str):
+			if s.isascii() and padding.isascii():
+				a = np.frombuffer((s + padding).encode('ascii'), np.uint8)
+				res = a[self.index].tobytes().decode('ascii')
+			else:
+				s = (s + padding).encode('utf-32-le')
+				a = np.frombuffer(s, np.uint32)
+				res = a[self.index].tobytes().decode('utf-32-le')
+		elif isinstance(s, (bytes, bytearray)):
+			if isinstance(padding, str):
+				padding = padding.encode('latin-1')
+			a = np.frombuffer(bytes(s) + padding, np.uint8)
+			res = a[self.index].tobytes()
+		else:
+			s = np.asarray(s)
+			if isinstance(padding, str) and s.dtype.kind in 'iu':
+				padding = ord(padding)
+			elif isinstance(padding, str) and s.dtype.kind != 'U':
+				raise TypeError(
+					'character padding for an array of {}'.format(s.dtype)
+				)
+			padding = np.array([padding], dtype = s.dtype)
+			res = np.concatenate((s, padding))[self.index]
+		return res
+
+	def then(self, plan):
+		"""
+			a single plan for this transposition 
+			followed by another
+
+			arguments
+				plan : TranspositionPlan
+					with an input length equal to 
+					this plan's output length
+			return
+				TranspositionPlan
+				None
+					if the lengths do not match
+		"""
+		res = None
+		if plan.length == len(self.index):
+			padding = np.array([self.length], dtype = self.index.dtype)
+			index = np.concatenate((self.index, padding))[plan.index]
+			res = TranspositionPlan(index, self.length, plan.dimensions)
+		return res
+
+def transposition_plan(mode, length, dimensions, transposition_key = None):
+	"""
+		compiled transposition of TranspositionCipher(mode, s, 
+		dimensions, transposition_key) for any s of the given length,
+		or of ScytaleCipher if there is no key
+
+		plans for short inputs are cached
+
+		arguments
+			mode : string
+				'encode' or 'decode'
+			length : int
+			dimensions : tuple of int
+			transposition_key : string
+				unique characters
+		return
+			TranspositionPlan
+			None
+				if the dimensions do not describe a matrix
+	"""
+	res = None
+	try:
+		dimensions = tuple(dimensions)
+	except TypeError:
+		pass
+	else:
+		if length <= CACHED_PLAN_LENGTH:
+			res = cached_transposition_plan(
+				mode, length, dimensions, transposition_key
+			)
+		else:
+			res = compile_transposition_plan(
+				mode, length, dimensions, transposition_key
+			)
+	return res
+
+@lru_cache(maxsize = 256)
+def cached_transposition_plan(mode, length, dimensions, transposition_key):
+	return compile_transposition_plan(
+		mode, length, dimensions, transposition_key
+	)
+
+def compile_transposition_plan(mode, length, dimensions, transposition_key):
+	res = None
+	m = plan_matrix(length, dimensions)
+	if m is not None:
+		order = None
+		if transposition_key:
+			order = permutation_order(transposition_key, mode)
+		if m.size:
+			if mode == 'encode':
+				m = permute_columns(m, order).T
+			elif mode == 'decode':
+				m = permute_columns(m.T, order)
+		# int32 halves the memory of the cached plans
+		dtype = np.int32 if length < INT32_LIMIT else np.intp
+		index = np.ascontiguousarray(m, dtype = dtype).reshape(-1)
+		index.flags.writeable = False
+		res = TranspositionPlan(index, length, m.shape)
+	return res
+
+def plan_matrix(length, dimensions):
+	# input positions laid out like string_matrix() would lay out 
+	# a string of the given length, with padding at position length
+	res = None
+	try:
+		r, c = dimensions
+	except (TypeError, ValueError):
+		pass
+	else:
+		n = 0
+		if length == 0 or (r == 0 and c == 0):
+			res = np.zeros((0, 0), dtype = np.intp)
+		elif c > 0:
+			if r <= 0:
+				r = -(-length // c)
+			n = r * c
+		elif r > 0:
+			c = -(-length // r)
+			n = r * c
+		if n:
+			res = np.minimum(np.arange(n), length).reshape(r, c)
+	return res
+
+def permute_columns(m, order):
+	# like string_matrix.transpose_columns(), 
+	# unchanged if the order does not cover the columns
+	res = m
+	if order is not None and len(order) == m.shape[1]:
+		res = m[:, order]
+	return res
+
+def permutation_order(transposition_key, mode):
+	"""
+		order of the columns for a columnar transposition
+
+		arguments
+			transposition_key : string
+				unique characters
+			mode : string
+				'encode' or 'decode'
+		return
+			list of int
+	"""
+	l = len(transposition_key)
+	res = sorted(range(l), key = lambda i: transposition_key[i])
+	if mode == 'decode':
+		inverse = [0] * l
+		for i, j in enumerate(res):
+			inverse[j] = i
+		res = inverse
+	return res
+
+def transpose_file(mode, source, target, transposition_key, 
+		padding = 'x', block_rows = 1 << 16):
+	"""
+		columnar transposition of a file into another file
+
+		the input is read through a memory map and every column 
+		is written straight to its place in a preallocated, 
+		memory-mapped output file, block_rows rows at a time, 
+		so memory use does not depend on the size of the file
+
+		the result is the same as get_s() of 
+			TranspositionCipher('encode', s, (-1, l), transposition_key)
+			TranspositionCipher('decode', s, (-1, len(s) // l), 
+				transposition_key)
+		for the single-byte characters s of the file, 
+		where l is the number of unique characters of the key
+
+		arguments
+			mode : string
+				'encode' or 'decode'
+			source : string
+				path of the input file
+			target : string
+				path of the output file
+			transposition_key : string
+			padding : string
+				single character the last row is padded with
+			block_rows : int
+		return
+			int
+				size of the output file
+			None
+				if the key is empty
+				if mode is not 'encode' or 'decode'
+				if a file to decode is not a whole number of rows
+	"""
+	res = None
+	key = string_processing.unique(transposition_key or '')
+	l = len(key)
+	size = os.path.getsize(source)
+	rows = None
+	if l > 0:
+		if mode == 'encode':
+			rows = -(-size // l)
+		elif mode == 'decode' and size % l == 0:
+			rows = size // l
+	if rows is not None:
+		res = rows * l
+		with open(target, 'wb') as f:
+			f.truncate(res)
+		if res > 0:
+			order = permutation_order(key, mode)
+			src = np.memmap(source, dtype = np.uint8, mode = 'r')
+			dst = np.memmap(target, dtype = np.uint8, mode = 'r+')
+			if mode == 'encode':
+				pad = np.frombuffer(padding.encode('latin-1'), np.uint8)
+				columns = dst.reshape(l, rows)
+				for r in range(0, rows, block_rows):
+					block = src[r * l : (r + block_rows) * l]
+					m = len(block) % l
+					if m > 0:
+						block = np.concatenate(
+							(block, np.repeat(pad, l - m))
+						)
+					block = block.reshape(-1, l)
+					columns[:, r : r + len(block)] = block[:, order].T
+			else:
+				columns = src.reshape(l, rows)
+				dst = dst.reshape(rows, l)
+				for r in range(0, rows, block_rows):
+					dst[r : r + block_rows] = columns[
+						order, r : r + block_rows
+					].T
+			dst.flush()
+			del src, dst
+	return res
@@ -0,0 +1,146 @@
+import heapq
+
+import parallel
+
+'''
+	wordlist attack on the grid key of Polybius family ciphers
+	(Polybius, Playfair, Bifid, Nihilist)
+
+	every word is turned into the characters of its grid without
+	building the grid, words giving the same grid are decoded once,
+	and one grid per process is refilled for every candidate
+
+	usage:
+		best = wordlist_attack(
+			ciphertext, words, grid_ciphers.PlayfairGrid, scorer
+		)
+		best = wordlist_attack(
+			ciphertext, words, grid_ciphers.NihilistGrid, scorer,
+			keyword = 'russian'
+		)
+
+	functions:
+		unique_grids() : the first word of every distinct grid
+		wordlist_attack() : best scoring grid keys of a wordlist
+'''
+
+def unique_grids(words, grid_class, **grid_kwargs):
+	"""
+		arguments
+			words : iterable of strings
+			grid_class : class
+				PolybiusGrid or one of its subclasses
+			grid_kwargs : dict
+				as passed to grid_class, such as remove or translate
+		return
+			generator of tuples
+				(word, grid characters), for the first word
+				giving each grid
+	"""
+	seen = set()
+	for word in words:
+		s = grid_class.key_grid(word, **grid_kwargs)
+		if s not in seen:
+			seen.add(s)
+			yield (word, s)
+
+def wordlist_attack(ciphertext, words, grid_class, scorer, top = 10,
+		stop_score = None, workers = None, chunk_size = None,
+		**grid_kwargs):
+	"""
+		arguments
+			ciphertext : string
+			words : iterable of strings
+				candidate grid keys
+			grid_class : class
+				PolybiusGrid or one of its subclasses
+			scorer : NgramScorer
+			top : int
+				number of keys kept
+			stop_score : float
+				the attack stops after a plaintext scores
+				at least this much, None to try every word
+			workers : int
+				None for one process per CPU, 1 to run
+				in this process
+			chunk_size : int
+				candidates sent to a process at a time
+			grid_kwargs : dict
+				passed to grid_class, such as remove, translate,
+				period for BifidGrid or keyword for NihilistGrid
+		return
+			list of tuples
+				(score, word, plaintext), best first
+	"""
+	res = []
+	candidates = unique_grids(words, grid_class, **grid_kwargs)
+	initargs = (grid_class, grid_kwargs, ciphertext, scorer, top)
+	if parallel.worker_count(workers) == 1:
+		init_worker(*initargs)
+		results = (
+			attack_chunk(chunk) 
+			for chunk in parallel.chunks(candidates, chunk_size)
+		)
+	else:
+		results = parallel.imap_ordered(
+			attack_chunks, candidates,
+			initializer = init_worker, initargs = initargs,
+			workers = workers, chunk_size = chunk_size
+		)
+	i = 0
+	for chunk in results:
+		for score, word, plaintext in chunk:
+			item = (score, -i, word, plaintext)
+			i += 1
+			if len(res) < top:
+				heapq.heappush(res, item)
+			elif item[:2] > res[0][:2]:
+				heapq.heapreplace(res, item)
+		if stop_score is not None and res and max(res)[0] >= stop_score:
+			break
+	# cancels the work still queued in the pool
+	results.close()
+	res.sort(key = lambda item: item[:2], reverse = True)
+	return [(score, word, plaintext) for score, _, word, plaintext in res]
+
+'''
+	workers
+'''
+
+# (grid, ciphertext, scorer, top) of the current process
+worker_state = None
+
+def init_worker(grid_class, grid_kwargs, ciphertext, scorer, top):
+	global worker_state
+	grid = grid_class(**grid_kwargs)
+	worker_state = (grid, ciphertext, scorer, top)
+
+def attack_chunk(candidates):
+	"""
+		arguments
+			candidates : list of tuples
+				(word, grid characters)
+		return
+			list of tuples
+				(score, word, plaintext), the best top of the chunk
+				in the order of the candidates
+	"""
+	grid, ciphertext, scorer, top = worker_state
+	decoded = []
+	for word, s in candidates:
+		plaintext = None
+		if grid.set_grid(s):
+			try:
+				plaintext = grid.decode(ciphertext)
+			except (TypeError, ValueError):
+				pass
+		if plaintext:
+			decoded.append((word, plaintext))
+	scores = scorer.score_batch([p for _, p in decoded]).tolist()
+	res = [(score, word, p) for score, (word, p) in zip(scores, decoded)]
+	best = set(heapq.nlargest(top, range(len(res)), key = lambda i: res[i][0]))
+	return [r for i, r in enumerate(res) if i in best]
+
+def attack_chunks(candidates):
+	# one result per chunk, as parallel.imap_ordered flattens lists
+	return [attack_chunk(candidates)]